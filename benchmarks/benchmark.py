@@ -0,0 +1,166 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+from tabulate import tabulate
+
+# the simulator and the control machine are separate folders of flat modules, import them from where they live
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "raspberrypi", "control-machine"))
+sys.path.insert(0, os.path.join(ROOT, "simulator"))
+
+from ParticleFilter import *
+from Astar import Astar, SEARCHES
+from MapGenerator import maze, obstacles
+
+# Benchmarks for the particle filter and A* hot paths
+# every case is seeded, timed (best of --repeats) and measured for peak traced memory in a separate run,
+# results go to a JSON file that can be compared against a stored baseline to catch regressions
+#
+# python3 benchmark.py --output results.json
+# python3 benchmark.py --output baseline.json                    (store a baseline)
+# python3 benchmark.py --compare baseline.json --threshold 0.2   (exit code 1 if any case got more than 20% slower)
+
+PYTHON_BACKEND_MAX_PARTICLES = 10_000 # the list-of-Robot backend takes minutes beyond this
+
+# time of the fastest repeat, the best estimate of the cost without interference from the rest of the machine
+def measure_time(setup, function, repeats):
+    best = math.inf
+    for _ in range(repeats):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        function(state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# peak memory allocated while running function, numpy arrays included (tracemalloc slows code down, so it gets its own run)
+def measure_memory(setup, function):
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    function(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run_case(results, name, setup, function, repeats):
+    results[name] = {
+        "time": measure_time(setup, function, repeats),
+        "peak_memory": measure_memory(setup, function),
+    }
+    print(f"{name}: {results[name]['time'] * 1000:.3f} ms, {results[name]['peak_memory'] / 1024:.1f} KiB")
+
+# Particle filter: each stage of one step timed on its own, for the given particle and obstacle counts
+def benchmark_particle_filter(results, particle_counts, obstacle_counts, backends, repeats, seed):
+    for backend in backends:
+        for num_obstacles in obstacle_counts:
+            for num_particles in particle_counts:
+                if backend == "python" and num_particles > PYTHON_BACKEND_MAX_PARTICLES:
+                    continue
+
+                def setup():
+                    obstacles = generate_obstacles(num_obstacles, seed)
+                    random.seed(seed)
+                    robot = Robot(ROBOT_STARTING_POS_X, ROBOT_STARTING_POS_Y, ROBOT_STARTING_ANGLE, ROBOT_COLOR, 0.1, 0.05, 2)
+                    # fixed particle count, log weighting and resampling every step, so every repeat does the same amount of work
+                    particle_filter = ParticleFilter(num_particles, robot, obstacles, backend=backend, weighting_mode="log", kld_sampling=False, resample_threshold=math.inf)
+                    particle_filter.apply_movement()
+                    particle_filter.update_particle_weights()
+                    return particle_filter
+
+                prefix = f"particle_filter/{backend}/particles={num_particles}/obstacles={num_obstacles}"
+                run_case(results, f"{prefix}/apply_movement", setup, lambda pf: pf.apply_movement(), repeats)
+                run_case(results, f"{prefix}/update_particle_weights", setup, lambda pf: pf.update_particle_weights(), repeats)
+                run_case(results, f"{prefix}/regenerate_particles", setup, lambda pf: pf.regenerate_particles(), repeats)
+
+# A* and Jump Point Search: open grids, random obstacles at several densities, and mazes
+def benchmark_astar(results, grid_sizes, densities, repeats, seed):
+    for size in grid_sizes:
+        layouts = [("open", set())]
+        layouts += [(f"random={density:g}", random_obstacles(size, density, seed)) for density in densities]
+        layouts.append(("maze", maze_obstacles(size, seed)))
+
+        for layout, obstacles in layouts:
+            start, dest = (0, 0), (size - 1, size - 1)
+            obstacles = obstacles - {start, dest}
+            for search in SEARCHES:
+                setup = lambda: Astar(size, size, obstacles, start, dest, search=search)
+                run_case(results, f"{search}/size={size}/{layout}/find_path", setup, lambda astar: astar.find_path(), repeats)
+
+# obstacle cells (x, y) filled independently with probability density
+def random_obstacles(size, density, seed):
+    rng = np.random.default_rng(seed)
+    xs, ys = np.nonzero(rng.random((size, size)) < density)
+    return set(zip(xs.tolist(), ys.tolist()))
+
+# recursive backtracker maze from the headless generator MapUI.build_maze uses: passages on even cells, walls everywhere else
+def maze_obstacles(size, seed):
+    walls = obstacles(maze(size, size, (0, 0), random.Random(seed), additional_paths=0), size)
+
+    # open a path to the far corner, which is a wall on even-sized grids
+    for cell in ((size - 1, size - 1), (size - 2, size - 1), (size - 1, size - 2)):
+        walls.discard(cell)
+    return walls
+
+# cases that got slower than baseline * (1 + threshold), in time or in peak memory
+def compare(results, baseline, threshold):
+    rows, regressions = [], []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("time", "peak_memory"):
+            ratio = result[metric] / baseline[name][metric] if baseline[name][metric] else 1.0
+            regressed = ratio > 1 + threshold
+            rows.append([name, metric, baseline[name][metric], result[metric], f"{ratio:.2f}x", "REGRESSION" if regressed else ""])
+            if regressed:
+                regressions.append((name, metric))
+
+    print(tabulate(rows, headers=["CASE", "METRIC", "BASELINE", "CURRENT", "RATIO", ""]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the particle filter and A* hot paths")
+    parser.add_argument("--suite", nargs="+", choices=["particle_filter", "astar"], default=["particle_filter", "astar"])
+    parser.add_argument("--particles", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--obstacles", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--backends", nargs="+", choices=["python", "numpy"], default=["python", "numpy"])
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.1, 0.3])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=45)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline JSON file written by an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a case counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {}
+    if "particle_filter" in args.suite:
+        benchmark_particle_filter(results, args.particles, args.obstacles, args.backends, args.repeats, args.seed)
+    if "astar" in args.suite:
+        benchmark_astar(results, args.grid_sizes, args.densities, args.repeats, args.seed)
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "machine": {"platform": platform.platform(), "python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count()},
+            "results": results,
+        }, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
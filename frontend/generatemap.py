@@ -1,6 +1,11 @@
+import json
+import multiprocessing
+import os
+import tempfile
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
+from stagecache import StageCache, file_hash, CACHE_DIR, CACHE_SIZE
 
 def detect_generalized_edges(image_path, scale_percent=50, blur_kernel_size=(15, 15), canny_threshold1=50, canny_threshold2=150, dilation_iterations=2, closing_kernel_size=(10, 10)):
     """
@@ -19,54 +24,281 @@ def detect_generalized_edges(image_path, scale_percent=50, blur_kernel_size=(15,
     # Read the image
     image = cv2.imread(image_path)
     # Resize the image
-    image = cv2.resize(image, (int(image.shape[1] * scale_percent / 100), int(image.shape[0] * scale_percent / 100)), interpolation=cv2.INTER_AREA)
-    # Convert to grayscale
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = resize_image(image, scale_percent)
+    return generalized_edges(image, blur_kernel_size, canny_threshold1, canny_threshold2, dilation_iterations, closing_kernel_size)
 
-    # Apply a larger blur
-    blurred_image = cv2.GaussianBlur(image, blur_kernel_size, 0)
-    # Detect edges using Canny
-    edges = cv2.Canny(blurred_image, canny_threshold1, canny_threshold2)
+def resize_image(image, scale_percent):
+    return cv2.resize(image, (int(image.shape[1] * scale_percent / 100), int(image.shape[0] * scale_percent / 100)), interpolation=cv2.INTER_AREA)
 
-    # Remove thin lines using morphological closing
-    closing_kernel = np.ones(closing_kernel_size, np.uint8)
-    closed_edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, closing_kernel)
+def edge_stages(blur_kernel_size=(15, 15), canny_threshold1=50, canny_threshold2=150, dilation_iterations=2, closing_kernel_size=(10, 10)):
+    """
+    The edge steps of detect_generalized_edges after resizing, each with the parameters its output depends on.
 
-    # Dilate the edges to make them thicker
+    :return: A list of (stage name, parameters, function of the previous stage's output).
+    """
+    closing_kernel = np.ones(closing_kernel_size, np.uint8)
     dilation_kernel = np.ones((5, 5), np.uint8)
-    dilated_edges = cv2.dilate(closed_edges, dilation_kernel, iterations=dilation_iterations)
+    return [
+        # Convert to grayscale and apply a larger blur
+        ("blur", {"blur_kernel_size": blur_kernel_size}, lambda image: cv2.GaussianBlur(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), blur_kernel_size, 0)),
+        # Detect edges using Canny
+        ("canny", {"canny_threshold1": canny_threshold1, "canny_threshold2": canny_threshold2}, lambda image: cv2.Canny(image, canny_threshold1, canny_threshold2)),
+        # Remove thin lines using morphological closing
+        ("closing", {"closing_kernel_size": closing_kernel_size}, lambda edges: cv2.morphologyEx(edges, cv2.MORPH_CLOSE, closing_kernel)),
+        # Dilate the edges to make them thicker
+        ("dilation", {"dilation_iterations": dilation_iterations}, lambda edges: cv2.dilate(edges, dilation_kernel, iterations=dilation_iterations)),
+    ]
+
+def generalized_edges(image, blur_kernel_size=(15, 15), canny_threshold1=50, canny_threshold2=150, dilation_iterations=2, closing_kernel_size=(10, 10)):
+    """
+    The edge steps of detect_generalized_edges on an already resized BGR image (or a tile of one).
+
+    :param image: A BGR image as a 3D array.
+    :return: A 2D array representing thick, generalized edges.
+    """
+    for _, _, step in edge_stages(blur_kernel_size, canny_threshold1, canny_threshold2, dilation_iterations, closing_kernel_size):
+        image = step(image)
+    return image
+
+POOLING_MODES = ("average", "max", "any", "threshold")
+MAP_CELL_SIZE = 50 # pixels per cell in the map builder (MapUI), it works out the grid size from the dimensions with it
+
+def pool(array, pool_size, mode="average", threshold=0.5):
+    """
+    Reduces the size of an array over non-overlapping blocks in one vectorized pass,
+    by viewing the array as (rows, block rows, columns, block columns) and reducing
+    the block axes. Rows and columns that don't fill a whole block are dropped.
+
+    :param array: The original 2D array (e.g., an edge image with values 0 or 255).
+    :param pool_size: The size of the block to pool over (e.g., (2, 2) for 2x2 blocks).
+    :param mode: How a block is reduced:
+        "average" - the block's mean rounded to 0 or 255 (a majority vote),
+        "max" - the block's largest value,
+        "any" - 255 if any pixel in the block is set,
+        "threshold" - 255 if at least `threshold` of the block's pixels are set.
+    :param threshold: Fraction of set pixels for a block to count as set in "threshold" mode.
+    :return: A smaller 2D array with one value per block.
+    """
+    if mode not in POOLING_MODES:
+        raise ValueError(f"unknown pooling mode {mode!r}, expected one of {POOLING_MODES}")
+
+    rows, cols = array.shape[0] // pool_size[0], array.shape[1] // pool_size[1]
+    blocks = array[:rows * pool_size[0], :cols * pool_size[1]].reshape(rows, pool_size[0], cols, pool_size[1])
+
+    if mode == "average":
+        pooled = np.round(blocks.mean(axis=(1, 3)) / 255) * 255
+    elif mode == "max":
+        pooled = blocks.max(axis=(1, 3))
+    elif mode == "any":
+        pooled = blocks.any(axis=(1, 3)) * 255
+    else:
+        pooled = ((blocks != 0).mean(axis=(1, 3)) >= threshold) * 255
+
+    return pooled.astype(array.dtype)
 
-    return dilated_edges
 def average_pooling(array, pool_size):
     """
     Reduces the size of an array by averaging over non-overlapping square blocks.
 
     :param array: The original 2D array (e.g., an image).
     :param pool_size: The size of the square block to average over (e.g., (2, 2) for 2x2 blocks).
-    :return: A smaller 2D array with each value being the average of a block.
+    :return: A smaller 2D array with each value being the average of a block, rounded to 0 or 255.
     """
-    # Calculate the shape of the output array
-    output_shape = (
-        array.shape[0] // pool_size[0],
-        array.shape[1] // pool_size[1]
-    )
+    return pool(array, pool_size, mode="average")
+
+def occupancy_map(grid, start=None, target=None):
+    """
+    Converts a pooled grid into the map JSON that MapUI.load_map reads and Astar plans on.
+    Grids of any size load, MapUI resizes itself to the map and shrinks its cells to fit.
+
+    :param grid: A 2D array, nonzero cells are obstacles. Row i is y = i, column j is x = j.
+    :param start: (x, y) start cell, defaults to the first free cell.
+    :param target: (x, y) target cell, defaults to the last free cell.
+    :return: A dict with start, target, obstacles and dimensions.
+    """
+    occupied = np.asarray(grid) != 0
+    ys, xs = np.nonzero(occupied)
+    free_ys, free_xs = np.nonzero(~occupied)
+    if len(free_xs) == 0:
+        raise ValueError("the grid has no free cells for the start and target")
 
-    # Initialize the output array
-    pooled_array = np.zeros(output_shape, dtype=array.dtype)
+    if start is None:
+        start = (int(free_xs[0]), int(free_ys[0]))
+    if target is None:
+        target = (int(free_xs[-1]), int(free_ys[-1]))
 
-    # Iterate over each block in the array
-    for i in range(output_shape[0]):
-        for j in range(output_shape[1]):
-            # Extract the block from the original array
-            block = array[
-                i * pool_size[0]:(i + 1) * pool_size[0],
-                j * pool_size[1]:(j + 1) * pool_size[1]
-            ]
+    return {
+        "start": list(start),
+        "target": list(target),
+        "obstacles": [[int(x), int(y)] for x, y in zip(xs, ys)],
+        "dimensions": {"width": occupied.shape[1] * MAP_CELL_SIZE, "height": occupied.shape[0] * MAP_CELL_SIZE},
+    }
 
-            # Calculate the average of the block, and round to the nearest integer
-            pooled_array[i, j] = round(np.mean(block) / 255) * 255
+def detect_edges_cached(image_path, cache, pool_size=(6, 6), mode="average", threshold=0.5, scale_percent=50, blur_kernel_size=(15, 15), canny_threshold1=50, canny_threshold2=150, dilation_iterations=2, closing_kernel_size=(10, 10)):
+    """
+    detect_generalized_edges followed by pool, keeping every stage's output in a StageCache.
+    Runs start from the last stage whose output is cached for the image and parameters,
+    so changing e.g. only the pooling reuses the edges and only pools again.
+
+    :param image_path: Path to the image file, keyed by its contents.
+    :param cache: The StageCache to read from and write to.
+    :return: The pooled 2D array.
+    """
+    stages = [("resize", {"scale_percent": scale_percent}, lambda image: resize_image(image, scale_percent))]
+    stages += edge_stages(blur_kernel_size, canny_threshold1, canny_threshold2, dilation_iterations, closing_kernel_size)
+    stages.append(("pool", {"pool_size": pool_size, "mode": mode, "threshold": threshold}, lambda edges: pool(edges, pool_size, mode=mode, threshold=threshold)))
+
+    keys = []
+    parent = file_hash(image_path)
+    for name, params, _ in stages:
+        parent = cache.key(parent, name, params)
+        keys.append(parent)
+
+    # the latest stage already cached, or the image itself if none are
+    first = 0
+    result = None
+    for i in reversed(range(len(stages))):
+        result = cache.get(keys[i])
+        if result is not None:
+            first = i + 1
+            break
+    if result is None:
+        result = cv2.imread(image_path)
+
+    for (_, _, step), key in zip(stages[first:], keys[first:]):
+        result = step(result)
+        cache.put(key, result)
+    return result
+
+# Tiled processing for images too big to hold with all the edge intermediates in memory.
+# Each tile is read from a memory-mapped copy of the image together with a halo of
+# surrounding pixels, run through the same steps as detect_generalized_edges, cropped
+# back to the tile and pooled straight into a memory-mapped output grid. Pixels more
+# than the halo away from a tile's edge don't see the cut, so the grid matches the
+# monolithic pipeline, except where Canny's hysteresis follows a weak edge further than
+# HYSTERESIS_MARGIN or the resize ratio isn't a whole number of source pixels.
+HYSTERESIS_MARGIN = 16
+TILE_SIZE = 1024
+
+def halo_size(blur_kernel_size=(15, 15), dilation_iterations=2, closing_kernel_size=(10, 10)):
+    """
+    Pixels around a tile that can change its edges: the blur radius, Canny's 3x3 Sobel,
+    the closing (a dilation then an erosion), the dilations and a margin for hysteresis.
+
+    :return: The halo width in resized pixels.
+    """
+    return max(blur_kernel_size) // 2 + 1 + max(closing_kernel_size) + 2 * dilation_iterations + HYSTERESIS_MARGIN
+
+def image_to_memmap(image_path, array_path):
+    """
+    Makes the image readable a tile at a time. .npy images are memory-mapped as they are,
+    anything else is decoded once and saved as .npy, the only time the full image is in memory.
+
+    :param image_path: Path to the image file, or to a BGR image saved with np.save.
+    :param array_path: Where to save the decoded image if it isn't a .npy file already.
+    :return: Path to a .npy file holding the BGR image.
+    """
+    if image_path.endswith(".npy"):
+        return image_path
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"could not read image {image_path}")
+    np.save(array_path, image)
+    return array_path
+
+def process_tile(task):
+    """
+    Runs one tile through the pipeline and writes its pooled cells to the output grid.
+
+    :param task: (source path, output path, tile bounds and its pooled bounds, pipeline settings).
+    """
+    source_path, output_path, (y0, y1, x0, x1), (row0, col0), settings = task
+    source = np.load(source_path, mmap_mode="r")
+    height, width = settings["resized_shape"]
+    halo = settings["halo"]
+
+    # the tile and its halo in resized pixels, and the source pixels they are resized from
+    top, bottom = max(0, y0 - halo), min(height, y1 + halo)
+    left, right = max(0, x0 - halo), min(width, x1 + halo)
+    ratio_y, ratio_x = source.shape[0] / height, source.shape[1] / width
+    region = source[
+        int(top * ratio_y):min(source.shape[0], int(np.ceil(bottom * ratio_y))),
+        int(left * ratio_x):min(source.shape[1], int(np.ceil(right * ratio_x)))
+    ]
+    region = cv2.resize(np.ascontiguousarray(region), (right - left, bottom - top), interpolation=cv2.INTER_AREA)
+
+    edges = generalized_edges(region, **settings["edges"])
+    edges = edges[y0 - top:y1 - top, x0 - left:x1 - left]
+    pooled = pool(edges, settings["pool_size"], mode=settings["mode"], threshold=settings["threshold"])
+
+    # tiles cover whole, disjoint blocks of cells, so workers can write to the grid at the same time
+    output = np.load(output_path, mmap_mode="r+")
+    output[row0:row0 + pooled.shape[0], col0:col0 + pooled.shape[1]] = pooled
+    output.flush()
+
+def detect_edges_tiled(image_path, output_path, pool_size=(6, 6), mode="average", threshold=0.5, scale_percent=50, tile_size=TILE_SIZE, halo=None, workers=None, blur_kernel_size=(15, 15), canny_threshold1=50, canny_threshold2=150, dilation_iterations=2, closing_kernel_size=(10, 10)):
+    """
+    detect_generalized_edges followed by pool, a tile at a time in a pool of worker processes.
+    Peak memory is the size of a tile and its halo per worker, not the size of the image.
+
+    :param image_path: Path to the image file, or a BGR image saved with np.save to skip decoding.
+    :param output_path: Path of the .npy file the pooled grid is written to.
+    :param tile_size: Tile side in resized pixels, rounded down to whole pooling blocks.
+    :param halo: Overlap read around each tile, defaults to halo_size() for the settings.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :return: The pooled grid, memory-mapped read-only from output_path.
+    """
+    edge_settings = {
+        "blur_kernel_size": blur_kernel_size,
+        "canny_threshold1": canny_threshold1,
+        "canny_threshold2": canny_threshold2,
+        "dilation_iterations": dilation_iterations,
+        "closing_kernel_size": closing_kernel_size,
+    }
+    if halo is None:
+        halo = halo_size(blur_kernel_size, dilation_iterations, closing_kernel_size)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_path = image_to_memmap(image_path, os.path.join(temp_dir, "source.npy"))
+        source_shape = np.load(source_path, mmap_mode="r").shape
+        height, width = int(source_shape[0] * scale_percent / 100), int(source_shape[1] * scale_percent / 100)
+
+        rows, cols = height // pool_size[0], width // pool_size[1]
+        output = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8, shape=(rows, cols))
+        del output
+
+        tile_rows = max(1, tile_size // pool_size[0])
+        tile_cols = max(1, tile_size // pool_size[1])
+        settings = {
+            "resized_shape": (height, width),
+            "halo": halo,
+            "pool_size": pool_size,
+            "mode": mode,
+            "threshold": threshold,
+            "edges": edge_settings,
+        }
+        tasks = [
+            (
+                source_path,
+                output_path,
+                (row * pool_size[0], min(rows, row + tile_rows) * pool_size[0], col * pool_size[1], min(cols, col + tile_cols) * pool_size[1]),
+                (row, col),
+                settings,
+            )
+            for row in range(0, rows, tile_rows)
+            for col in range(0, cols, tile_cols)
+        ]
+
+        if workers == 1:
+            for task in tasks:
+                process_tile(task)
+        else:
+            with multiprocessing.Pool(workers) as worker_pool:
+                for _ in worker_pool.imap_unordered(process_tile, tasks):
+                    pass
+
+    return np.load(output_path, mmap_mode="r")
 
-    return pooled_array
 def display_edges(edges_array):
     """
     Displays a 2D NumPy array of edges as a grayscale image.
@@ -80,13 +312,63 @@ def display_edges(edges_array):
     # Display the image
     plt.show()
 
-def main(image_path):
-    edges = detect_generalized_edges(image_path)
-    pooled_edges = average_pooling(edges, pool_size=(6, 6))
+def main(image_path, pool_size=(6, 6), mode="average", threshold=0.5, output=None, start=None, target=None, show=True, tile_size=None, grid_output=None, workers=None, cache_dir=CACHE_DIR, cache_size=CACHE_SIZE):
+    if tile_size:
+        # stream big images through tiles, the pooled grid is the only full-size result
+        grid_output = grid_output or os.path.splitext(image_path)[0] + ".grid.npy"
+        pooled_edges = detect_edges_tiled(image_path, grid_output, pool_size, mode=mode, threshold=threshold, tile_size=tile_size, workers=workers)
+    elif cache_dir:
+        pooled_edges = detect_edges_cached(image_path, StageCache(cache_dir, cache_size), pool_size, mode=mode, threshold=threshold)
+    else:
+        edges = detect_generalized_edges(image_path)
+        pooled_edges = pool(edges, pool_size, mode=mode, threshold=threshold)
     print(len(pooled_edges),len(pooled_edges[0]))
-    display_edges(pooled_edges)
+
+    if output:
+        map_data = occupancy_map(pooled_edges, start=start, target=target)
+        with open(output, "w") as file:
+            json.dump(map_data, file)
+        print(f"map with {len(map_data['obstacles'])} obstacles saved to {output}")
+
+    if show:
+        display_edges(pooled_edges)
+
+def parse_cell(text):
+    x, y = text.split(",")
+    return int(x), int(y)
 
 if __name__ == '__main__':
-    import sys
-    main(sys.argv[1])
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Turn a floorplan image into an occupancy grid for the map builder and planners")
+    parser.add_argument("image_path")
+    parser.add_argument("--pool", type=int, nargs=2, default=(6, 6), metavar=("ROWS", "COLS"), help="pixels per grid cell")
+    parser.add_argument("--mode", choices=POOLING_MODES, default="average")
+    parser.add_argument("--threshold", type=float, default=0.5, help="fraction of edge pixels for a cell to be an obstacle in threshold mode")
+    parser.add_argument("--output", help="write the grid as map JSON (start, target, obstacles, dimensions)")
+    parser.add_argument("--start", type=parse_cell, help="start cell as x,y")
+    parser.add_argument("--target", type=parse_cell, help="target cell as x,y")
+    parser.add_argument("--no-show", action="store_true", help="don't display the grid")
+    parser.add_argument("--tile-size", type=int, help="process the image in tiles of this many resized pixels, for images too big for memory")
+    parser.add_argument("--grid-output", help="where tiled mode writes the pooled grid (.npy), defaults to next to the image")
+    parser.add_argument("--workers", type=int, help="worker processes for tiled mode, defaults to the number of CPUs")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="where intermediate results are cached between runs")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE // (1024 * 1024), help="cache size limit in MB, least recently used results are removed first")
+    parser.add_argument("--no-cache", action="store_true", help="process the image from scratch without the cache")
+    args = parser.parse_args()
 
+    main(
+        args.image_path,
+        pool_size=tuple(args.pool),
+        mode=args.mode,
+        threshold=args.threshold,
+        output=args.output,
+        start=args.start,
+        target=args.target,
+        show=not args.no_show,
+        tile_size=args.tile_size,
+        grid_output=args.grid_output,
+        workers=args.workers,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_size=args.cache_size * 1024 * 1024,
+    )
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "generatemap")
+CACHE_SIZE = 512 * 1024 * 1024  # bytes
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Hashes a file's contents, so a renamed or copied image still hits the cache and an edited one doesn't.
+
+    :param path: Path to the file.
+    :return: The hex SHA-256 of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    On-disk cache of pipeline stage outputs, one compressed .npz file per output.
+
+    Keys are content addressed: a stage's key hashes the key of the stage before it
+    (the image hash for the first one) with the stage's name and parameters, so a
+    changed parameter misses the cache for that stage and everything after it, and
+    the stages before it are loaded instead of recomputed.
+
+    Reading a file marks it as used; once the files take more than max_bytes the
+    least recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, parent, stage, params):
+        """
+        :param parent: Key of the previous stage, or the hash of the input file.
+        :param stage: Name of the stage.
+        :param params: JSON-serializable parameters the stage's output depends on.
+        :return: The key of the stage's output.
+        """
+        content = json.dumps([parent, stage, params], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                array = data["array"]
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return array
+
+    def put(self, key, array):
+        # write to a temporary file first so an interrupted run never leaves a truncated entry
+        descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez_compressed(file, array=array)
+        os.replace(temp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.cache_dir, name))
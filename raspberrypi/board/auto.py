@@ -1,94 +1,40 @@
-import time
-from gpiozero import Servo, DistanceSensor
-import threading
+import argparse
+import asyncio
 import json
+import hardware
 from conf import *
+from controller import MotionController
 
-# Set GPIO for ultrasonic sensors
-sensor_centre = DistanceSensor(trigger=TRIGGER_PIN_CENTRE, echo=ECHO_PIN_CENTRE)
-sensor_left = DistanceSensor(trigger=TRIGGER_PIN_LEFT, echo=ECHO_PIN_LEFT)
-sensor_right = DistanceSensor(trigger=TRIGGER_PIN_RIGHT, echo=ECHO_PIN_RIGHT)
+def create_devices(simulate=False):
+    if simulate:
+        hardware.use_backend("simulated")
 
-# Set GPIO for servos
-left_servo = Servo(LEFT_SERVO_PIN)
-right_servo = Servo(RIGHT_SERVO_PIN)
+    # Set GPIO for ultrasonic sensors
+    sensors = {
+        "centre": hardware.DistanceSensor(trigger=TRIGGER_PIN_CENTRE, echo=ECHO_PIN_CENTRE),
+        "left": hardware.DistanceSensor(trigger=TRIGGER_PIN_LEFT, echo=ECHO_PIN_LEFT),
+        "right": hardware.DistanceSensor(trigger=TRIGGER_PIN_RIGHT, echo=ECHO_PIN_RIGHT),
+    }
 
-FORWARD = 1
-BACKWARD = -1
-# STOP_TIME = 0.5 # how long we should stop between movements
+    # Set GPIO for servos
+    left_servo = hardware.Servo(LEFT_SERVO_PIN)
+    right_servo = hardware.Servo(RIGHT_SERVO_PIN)
 
-SERVO_FACTOR = 7.5 # adjust so we can calculate time to move specified certain distance
-TURNING_FACTOR = 90 / 1.3 # adjust so we can calculate time to turn specified angle
+    return left_servo, right_servo, sensors
 
-# estimated distance in metres
-def move_forward(distance):
-    left_servo.value = FORWARD
-    right_servo.value = BACKWARD
-
-    time.sleep(distance * SERVO_FACTOR)
-
-# estimated distance in metres
-def move_backward(distance):
-    left_servo.value = BACKWARD
-    right_servo.value = FORWARD
-
-    time.sleep(distance * SERVO_FACTOR)
-
-# counter clockwise
-# estimated degrees to turn
-def turn_left(degrees):
-    left_servo.value = BACKWARD
-    right_servo.value = BACKWARD
-
-    time.sleep(degrees / TURNING_FACTOR)
-
-# clockwise
-# estimated degrees to turn
-def turn_right(degrees):
-    left_servo.value = FORWARD
-    right_servo.value = FORWARD
-
-    time.sleep(degrees / TURNING_FACTOR)
-
-def stop():
-    left_servo.detach()
-    right_servo.detach()
-
-def read_sensors(sensors, stop_event):
-    while not stop_event.is_set():
-        centre, left, right = sensors
-        c = centre.distance * 100  # convert to cm
-        l = left.distance * 100
-        r = right.distance * 100
-        print(f"[Distances] Left: {l:.2f} cm | Centre: {c:.2f} cm | Right: {r:.2f} cm")
-
-        if c < STOP_DISTANCE or l < STOP_DISTANCE or r < STOP_DISTANCE:
-            print("Obstacle detected! Stopping the robot.")
-            stop()
-            stop_event.set()  # This will stop the sensor thread
-
-        time.sleep(0.1)
+def main():
+    parser = argparse.ArgumentParser(description="Follow the directions in path.json, stopping for obstacles")
+    parser.add_argument("--simulate", action="store_true", help="use simulated servos and sensors instead of the GPIO pins, same as ROBOT_BACKEND=simulated")
+    parser.add_argument("--obstacle-after", type=float, help="with --simulate, an obstacle appears in front of the robot after this many seconds")
+    args = parser.parse_args()
 
-def move_robot(stop_event):
     with open("path.json", "r") as file:
         data = json.load(file)
         directions = data["directions"]
 
-    for direction in directions:
-        if stop_event.is_set():
-            break
-
-        if direction == "L":
-            print("Turning left")
-            turn_left(90)
-        elif direction == "R":
-            print("Turning right")
-            turn_right(90)
-        elif direction == "F":
-            print("Moving forward")
-            move_forward(BLOCK_SIZE)
+    left_servo, right_servo, sensors = create_devices(args.simulate)
+    controller = MotionController(left_servo, right_servo, sensors)
 
-def main():
     # stop servos on program start
     left_servo.detach()
     right_servo.detach()
@@ -96,26 +42,21 @@ def main():
     try:
         input("Press Enter to start the automatic movement sequence")
 
-        # to constantly read sensors in a separate thread
-        stop_event = threading.Event()
-        sensors = [sensor_centre, sensor_left, sensor_right]
-        sensor_thread = threading.Thread(target=read_sensors, args=(sensors, stop_event))
-        sensor_thread.start()
+        if hardware.backend == "simulated" and args.obstacle_after is not None:
+            sensors["centre"].set_distance_after(args.obstacle_after, STOP_DISTANCE / 200)
 
-        move_robot(stop_event)
+        completed = asyncio.run(controller.run(directions))
+        print("Path completed" if completed else "Path interrupted by an obstacle")
 
     except KeyboardInterrupt:
         print("\nProgram interrupted by user. Exiting...")
     finally:
         # stop servos on program completion
-        stop()
-        
-        # close sensors and sensor thread
-        sensor_centre.close()
-        sensor_left.close()
-        sensor_right.close()
-        stop_event.set()
-        sensor_thread.join()
+        controller.cut_servos()
+
+        # close sensors
+        for sensor in sensors.values():
+            sensor.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
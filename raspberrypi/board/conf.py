@@ -16,4 +16,7 @@ ECHO_PIN_RIGHT = 19 # GPIO 19, physical pin 35
 
 STOP_DISTANCE = 20 # in cm, stop if sensors detect an object within this distance
 
-BLOCK_SIZE = 0.25 # in m, size of a block on the grid/map
\ No newline at end of file
+BLOCK_SIZE = 0.25 # in m, size of a block on the grid/map
+
+SERVO_FACTOR = 7.5 # adjust so we can calculate time to move specified certain distance
+TURNING_FACTOR = 90 / 1.3 # adjust so we can calculate time to turn specified angle
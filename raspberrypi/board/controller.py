@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import threading
+import time
+from conf import *
+
+FORWARD = 1
+BACKWARD = -1
+
+SENSOR_INTERVAL = 0.02 # in s, how often the sensors are polled, sensors that can call back on their own stop the robot sooner
+PRINT_INTERVAL = 0.1 # in s, how often the distances are printed
+REACTION_LOG = "reaction_log.txt" # every emergency stop is appended here with its reaction time
+# Reaction times run from when the reading that saw the obstacle was taken to when the servos were cut.
+# Polled sensors are timed from the start of the read, sensors that know when their reading changed
+# (the simulated ones) from that change. gpiozero doesn't say when its reading was taken, so its callbacks
+# are timed from when they are called. Polling also logs the most it could have been: the obstacle
+# showed up after the last reading that was clear.
+
+# left servo value, right servo value and how long to hold them for each command in path.json
+MOVES = {
+    "F": (FORWARD, BACKWARD, BLOCK_SIZE * SERVO_FACTOR),
+    "B": (BACKWARD, FORWARD, BLOCK_SIZE * SERVO_FACTOR),
+    "L": (BACKWARD, BACKWARD, 90 / TURNING_FACTOR), # counter clockwise
+    "R": (FORWARD, FORWARD, 90 / TURNING_FACTOR), # clockwise
+}
+MOVE_NAMES = {"F": "Moving forward", "B": "Moving backward", "L": "Turning left", "R": "Turning right"}
+
+# Drives the robot through a list of directions while watching the distance sensors.
+# Moving, polling the sensors and the emergency stop run concurrently on an asyncio
+# event loop: a move is an await on a timer, so when an obstacle shows up the servos
+# are cut straight away and the move in progress is cancelled instead of finishing.
+# Sensors with a when_in_range callback (gpiozero's DistanceSensor, or the simulated
+# one) stop the robot from their own thread as soon as they see it, polling is the fallback.
+class MotionController:
+    def __init__(self, left_servo, right_servo, sensors, stop_distance=STOP_DISTANCE, sensor_interval=SENSOR_INTERVAL, log_path=REACTION_LOG):
+        self.left_servo = left_servo
+        self.right_servo = right_servo
+        self.sensors = sensors # name -> distance sensor, e.g. {"centre": ..., "left": ..., "right": ...}
+        self.stop_distance = stop_distance # in cm
+        self.sensor_interval = sensor_interval
+        self.log_path = log_path
+
+        self.loop = None
+        self.motion_task = None
+        self.lock = threading.Lock() # sensor callbacks come from other threads
+        self.emergency_stopped = False
+        self.reactions = [] # one dict per emergency stop
+
+    def cut_servos(self):
+        self.left_servo.detach()
+        self.right_servo.detach()
+
+    # can be called from any thread, only the first call does anything,
+    # without a distance the sensor is read for the log once the servos are cut.
+    # sampled_at is when the reading that saw the obstacle was taken, clear_at when the last one that didn't was
+    def emergency_stop(self, source, distance=None, sampled_at=None, clear_at=None):
+        with self.lock:
+            if self.emergency_stopped:
+                return
+            self.emergency_stopped = True
+            self.cut_servos()
+            stopped_at = time.perf_counter()
+
+        if distance is None:
+            distance = self.sensors[source].distance * 100
+
+        sampled_at = sampled_at if sampled_at is not None else stopped_at
+        changed_at = getattr(self.sensors.get(source), "changed_at", None)
+        if changed_at is not None and changed_at <= sampled_at:
+            sampled_at = changed_at
+
+        reaction = {
+            "source": source,
+            "distance": distance,
+            "reaction_ms": (stopped_at - sampled_at) * 1000,
+            "max_reaction_ms": (stopped_at - clear_at) * 1000 if clear_at is not None else None,
+        }
+        self.reactions.append(reaction)
+        bound = f" (at most {reaction['max_reaction_ms']:.2f} ms)" if clear_at is not None else ""
+        print(f"Obstacle detected by {source} sensor at {distance:.2f} cm! Stopped the robot in {reaction['reaction_ms']:.2f} ms{bound}")
+        if self.log_path:
+            with open(self.log_path, "a") as log_file:
+                log_file.write(f"{datetime.datetime.now()} {source} {distance:.2f} cm {reaction['reaction_ms']:.3f} ms{bound}\n")
+
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.cancel_motion)
+
+    def cancel_motion(self):
+        if self.motion_task is not None:
+            self.motion_task.cancel()
+
+    async def drive(self, left, right, duration):
+        # under the lock, so a stop from a sensor callback can't land between the check and powering the servos
+        with self.lock:
+            if self.emergency_stopped:
+                return
+            self.left_servo.value = left
+            self.right_servo.value = right
+        await asyncio.sleep(duration)
+
+    async def follow(self, directions):
+        for direction in directions:
+            print(MOVE_NAMES[direction])
+            await self.drive(*MOVES[direction])
+        self.cut_servos()
+
+    async def watch_sensors(self):
+        last_print = 0
+        clear_at = None # when the last reading without an obstacle was taken
+        while not self.emergency_stopped:
+            # read all sensors at once in worker threads, a slow read doesn't hold up the others or the event loop
+            sampled_at = time.perf_counter()
+            readings = await asyncio.gather(*(asyncio.to_thread(getattr, sensor, "distance") for sensor in self.sensors.values()))
+            distances = {name: reading * 100 for name, reading in zip(self.sensors, readings)} # convert to cm
+
+            if sampled_at - last_print >= PRINT_INTERVAL:
+                print("[Distances] " + " | ".join(f"{name.title()}: {distance:.2f} cm" for name, distance in distances.items()))
+                last_print = sampled_at
+
+            for name, distance in distances.items():
+                if distance < self.stop_distance:
+                    self.emergency_stop(name, distance, sampled_at, clear_at)
+                    return
+            clear_at = sampled_at
+
+            await asyncio.sleep(self.sensor_interval)
+
+    def in_range_callback(self, name):
+        def callback():
+            self.emergency_stop(name, sampled_at=time.perf_counter())
+        return callback
+
+    # follow the directions until they are done or an obstacle stops the robot,
+    # returns True if every direction was completed
+    async def run(self, directions):
+        self.loop = asyncio.get_running_loop()
+        for name, sensor in self.sensors.items():
+            if hasattr(sensor, "when_in_range"):
+                sensor.threshold_distance = self.stop_distance / 100
+                sensor.when_in_range = self.in_range_callback(name)
+
+        self.motion_task = asyncio.create_task(self.follow(directions))
+        sensor_task = asyncio.create_task(self.watch_sensors())
+        try:
+            await asyncio.wait([self.motion_task, sensor_task], return_when=asyncio.FIRST_COMPLETED)
+            # a failed read (e.g. OSError on an echo timeout) ends the sensor task, driving on blind isn't an option
+            if sensor_task.done() and sensor_task.exception() is not None:
+                with self.lock:
+                    self.emergency_stopped = True
+                    self.cut_servos()
+                print(f"Reading the sensors failed, stopped the robot: {sensor_task.exception()!r}")
+                raise sensor_task.exception()
+            await self.motion_task
+            return True
+        except asyncio.CancelledError:
+            if not self.emergency_stopped:
+                raise # cancelled from outside, e.g. Ctrl+C
+            return False
+        finally:
+            self.motion_task.cancel()
+            sensor_task.cancel()
+            for sensor in self.sensors.values():
+                if hasattr(sensor, "when_in_range"):
+                    sensor.when_in_range = None
+            self.cut_servos()
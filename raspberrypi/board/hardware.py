@@ -0,0 +1,45 @@
+import os
+
+# Device abstraction layer: the scripts create their devices through these functions
+# instead of importing gpiozero, smbus and serial themselves, so the same code runs on
+# the Raspberry Pi ("gpio" backend) or anywhere else with simulated devices
+# ("simulated" backend, see simulated.py). The backend comes from the ROBOT_BACKEND
+# environment variable, or use_backend() before the devices are created:
+#
+#   ROBOT_BACKEND=simulated python3 manual.py
+BACKENDS = ("gpio", "simulated")
+backend = os.environ.get("ROBOT_BACKEND", "gpio")
+
+def use_backend(name):
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r}, expected one of {BACKENDS}")
+    backend = name
+
+def Servo(pin, **kwargs):
+    if backend == "simulated":
+        from simulated import SimulatedServo
+        return SimulatedServo(pin, **kwargs)
+    from gpiozero import Servo
+    return Servo(pin, **kwargs)
+
+def DistanceSensor(trigger, echo, **kwargs):
+    if backend == "simulated":
+        from simulated import SimulatedDistanceSensor
+        return SimulatedDistanceSensor(trigger=trigger, echo=echo, **kwargs)
+    from gpiozero import DistanceSensor
+    return DistanceSensor(trigger=trigger, echo=echo, **kwargs)
+
+def SMBus(bus, **kwargs):
+    if backend == "simulated":
+        from simulated import SimulatedSMBus
+        return SimulatedSMBus(bus, **kwargs)
+    import smbus
+    return smbus.SMBus(bus, **kwargs)
+
+def Serial(port, baudrate, **kwargs):
+    if backend == "simulated":
+        from simulated import SimulatedSerial
+        return SimulatedSerial(port, baudrate, **kwargs)
+    import serial
+    return serial.Serial(port, baudrate, **kwargs)
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import sys
+from conf import *
+from controller import MotionController
+from simulated import Signal, SimulatedServo, SimulatedDistanceSensor
+
+# Load test of the obstacle stop without the robot: the controller follows a path with
+# simulated servos and sensors, an obstacle appears in front of the centre sensor at a
+# random time, and the time until the servos are cut is measured from the moment the
+# obstacle appeared (so it includes waiting for the next sensor reading). Runs every
+# combination of sensor rate, read latency and callbacks on/off.
+#
+#   python3 loadtest.py --rates 10 20 100 1000 --latencies 0 0.005 0.02 --runs 10
+
+DIRECTIONS = ["F"] * 10
+OBSTACLE_DISTANCE = STOP_DISTANCE / 200 # in m, half the stop distance
+
+def run_once(rate, read_latency, callbacks, obstacle_at):
+    left_servo, right_servo = SimulatedServo(), SimulatedServo()
+    signal = Signal(function=lambda t: OBSTACLE_DISTANCE if t >= obstacle_at else 1.0)
+    sensors = {
+        "centre": SimulatedDistanceSensor(signal=signal, rate=rate, read_latency=read_latency, callbacks=callbacks),
+        "left": SimulatedDistanceSensor(signal=Signal.constant(1.0), rate=rate, read_latency=read_latency, callbacks=callbacks),
+        "right": SimulatedDistanceSensor(signal=Signal.constant(1.0), rate=rate, read_latency=read_latency, callbacks=callbacks),
+    }
+    controller = MotionController(left_servo, right_servo, sensors, log_path=None)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            completed = asyncio.run(controller.run(DIRECTIONS))
+    finally:
+        for sensor in sensors.values():
+            sensor.close()
+
+    appeared = sensors["centre"].sampler.start_time + obstacle_at
+    stops = [t for t, value in left_servo.history if value is None and t >= appeared]
+    if completed or not stops:
+        return None
+    return (stops[0] - appeared) * 1000
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how fast the motion controller stops for an obstacle with simulated sensors")
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 20, 100, 1000], help="sensor readings per second")
+    parser.add_argument("--latencies", type=float, nargs="+", default=[0, 0.005, 0.02], help="seconds every sensor read blocks for")
+    parser.add_argument("--runs", type=int, default=5, help="runs per combination")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--max-reaction-ms", type=float, help="exit with an error if any combination's 95th percentile is slower")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    print(f"{'RATE':>8} {'LATENCY':>8} {'CALLBACKS':>9} {'MEAN MS':>8} {'P95 MS':>8} {'MAX MS':>8} {'MISSED':>6}")
+    for rate in args.rates:
+        for read_latency in args.latencies:
+            for callbacks in (True, False):
+                reactions = [run_once(rate, read_latency, callbacks, rng.uniform(0.2, 0.5)) for _ in range(args.runs)]
+                stopped = [reaction for reaction in reactions if reaction is not None]
+                result = {
+                    "rate": rate,
+                    "read_latency": read_latency,
+                    "callbacks": callbacks,
+                    "mean_ms": sum(stopped) / len(stopped) if stopped else None,
+                    "p95_ms": percentile(stopped, 0.95) if stopped else None,
+                    "max_ms": max(stopped) if stopped else None,
+                    "missed": len(reactions) - len(stopped),
+                }
+                results.append(result)
+                print(f"{rate:>8g} {read_latency:>8g} {str(callbacks):>9} " + " ".join(f"{result[key]:>8.2f}" if result[key] is not None else f"{'-':>8}" for key in ("mean_ms", "p95_ms", "max_ms")) + f" {result['missed']:>6}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.max_reaction_ms is not None:
+        slow = [result for result in results if result["missed"] or result["p95_ms"] > args.max_reaction_ms]
+        if slow:
+            print(f"{len(slow)} combinations missed the obstacle or took longer than {args.max_reaction_ms} ms")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,15 @@
-import serial,time
+import hardware,time
 import numpy as np
 #
 ##########################
 # TFLuna Lidar
 ##########################
 #
-ser = serial.Serial("/dev/serial1", 115200,timeout=0) # mini UART serial device
-#
 ############################
 # read ToF data from TF-Luna
 ############################
 #
-def read_tfluna_data():
+def read_tfluna_data(ser):
     while True:
         counter = ser.in_waiting # count the number of bytes of the serial port
         #print(counter)
@@ -26,10 +24,15 @@ def read_tfluna_data():
                 temperature = (temperature/8.0) - 256.0 # temp scaling and offset
                 return distance/100.0,strength,temperature
 
-if ser.isOpen() == False:
-    ser.open() # open serial port if not open
-print(ser.isOpen())
-distance,strength,temperature = read_tfluna_data() # read values
-print('Distance: {0:2.2f} m, Strength: {1:2.0f} / 65535 (16-bit), Chip Temperature: {2:2.1f} C'.\
-              format(distance,strength,temperature)) # print sample data
-ser.close() # close serial port
+def main():
+    ser = hardware.Serial("/dev/serial1", 115200,timeout=0) # mini UART serial device
+    if ser.isOpen() == False:
+        ser.open() # open serial port if not open
+    print(ser.isOpen())
+    distance,strength,temperature = read_tfluna_data(ser) # read values
+    print('Distance: {0:2.2f} m, Strength: {1:2.0f} / 65535 (16-bit), Chip Temperature: {2:2.1f} C'.\
+                  format(distance,strength,temperature)) # print sample data
+    ser.close() # close serial port
+
+if __name__ == '__main__':
+    main()
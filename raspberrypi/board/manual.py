@@ -1,43 +1,46 @@
 import threading
-from gpiozero import Servo
-from gpiozero import DistanceSensor
+import hardware
 import sys
 import termios
 import tty
 import time
 from conf import *
 
-# Set GPIO for ultrasonic sensor
-sensor_centre = DistanceSensor(trigger=TRIGGER_PIN_CENTRE, echo=ECHO_PIN_CENTRE)
-sensor_left = DistanceSensor(trigger=TRIGGER_PIN_LEFT, echo=ECHO_PIN_LEFT)
-sensor_right = DistanceSensor(trigger=TRIGGER_PIN_RIGHT, echo=ECHO_PIN_RIGHT)
-
-# Set GPIO for servos
-left_servo = Servo(LEFT_SERVO_PIN)
-right_servo = Servo(RIGHT_SERVO_PIN)
-
 FORWARD = 1
 BACKWARD = -1
 
-def move_forward():
+# devices are created when the program runs, not on import, so hardware.use_backend() can still pick them
+def create_devices():
+    # Set GPIO for ultrasonic sensor
+    sensor_centre = hardware.DistanceSensor(trigger=TRIGGER_PIN_CENTRE, echo=ECHO_PIN_CENTRE)
+    sensor_left = hardware.DistanceSensor(trigger=TRIGGER_PIN_LEFT, echo=ECHO_PIN_LEFT)
+    sensor_right = hardware.DistanceSensor(trigger=TRIGGER_PIN_RIGHT, echo=ECHO_PIN_RIGHT)
+
+    # Set GPIO for servos
+    left_servo = hardware.Servo(LEFT_SERVO_PIN)
+    right_servo = hardware.Servo(RIGHT_SERVO_PIN)
+
+    return left_servo, right_servo, [sensor_centre, sensor_left, sensor_right]
+
+def move_forward(left_servo, right_servo):
     left_servo.value = FORWARD
     right_servo.value = BACKWARD
 
-def move_backward():
+def move_backward(left_servo, right_servo):
     left_servo.value = BACKWARD
     right_servo.value = FORWARD
 
 # counter clockwise
-def turn_left():
+def turn_left(left_servo, right_servo):
     left_servo.value = BACKWARD
     right_servo.value = BACKWARD
 
 # clockwise
-def turn_right():
+def turn_right(left_servo, right_servo):
     left_servo.value = FORWARD
     right_servo.value = FORWARD
 
-def stop():
+def stop(left_servo, right_servo):
     left_servo.detach()
     right_servo.detach()
 
@@ -63,31 +66,32 @@ def read_sensors(sensors, stop_event):
         time.sleep(0.1)
 
 def main():
+    left_servo, right_servo, sensors = create_devices()
+
     # to constantly read sensors in a separate thread
     stop_event = threading.Event()
-    sensors = [sensor_centre, sensor_left, sensor_right]
     sensor_thread = threading.Thread(target=read_sensors, args=(sensors, stop_event))
     sensor_thread.start()
     
-    stop()  # stop servos on program start
+    stop(left_servo, right_servo)  # stop servos on program start
     try:
         while True:
             char = getch()
             if char == 'w':
                 print("Moving Forward")
-                move_forward()
+                move_forward(left_servo, right_servo)
             elif char == 's':
                 print("Moving Backward")
-                move_backward()
+                move_backward(left_servo, right_servo)
             elif char == 'a':
                 print("Turning Left")
-                turn_left()
+                turn_left(left_servo, right_servo)
             elif char == 'd':
                 print("Turning Right")
-                turn_right()
+                turn_right(left_servo, right_servo)
             elif char == 't':
                 print("Stopping")
-                stop()
+                stop(left_servo, right_servo)
             elif char == 'q':
                 print("Exiting")
                 break
@@ -96,12 +100,11 @@ def main():
         pass
     finally:
         # stop servos on program completion
-        stop()
+        stop(left_servo, right_servo)
 
         # close sensors and sensor thread
-        sensor_centre.close()
-        sensor_left.close()
-        sensor_right.close()
+        for sensor in sensors:
+            sensor.close()
         stop_event.set()
         sensor_thread.join()
 
@@ -0,0 +1,266 @@
+import bisect
+import csv
+import math
+import threading
+import time
+
+# Stand-ins for the devices the robot uses (gpiozero servos and distance sensors, the
+# MPU6050 on I2C, the TF-Luna lidar on serial), so the control code can run, be
+# profiled and load tested off the Raspberry Pi. They have the attributes the scripts
+# use. Readings come from a Signal: a function of time for synthetic data or a
+# recorded trace replayed, sampled at the device's rate.
+
+SENSOR_RATE = 20 # Hz, readings per second of a simulated distance sensor
+MPU6050_RATE = 1000 # Hz, gyroscope output rate
+TF_LUNA_RATE = 100 # Hz, frames per second, the TF-Luna's default
+SERIAL_BUFFER_SIZE = 4096 # bytes, older bytes are dropped like an overflowing UART
+
+# values over time: function(t) with t in seconds since the device started, or a trace
+# of (t, value) or (t, value1, value2, ...) rows replayed as a step function
+class Signal:
+    def __init__(self, function=None, trace=None, repeat=False):
+        if (function is None) == (trace is None):
+            raise ValueError("a signal needs either a function or a trace")
+        self.function = function
+        self.trace = sorted(trace) if trace is not None else None
+        self.times = [row[0] for row in self.trace] if trace is not None else None
+        self.repeat = repeat
+
+    @classmethod
+    def constant(cls, value):
+        return cls(function=lambda t: value)
+
+    # a trace saved by record_trace: a header row, then time and one column per value
+    @classmethod
+    def from_csv(cls, path, repeat=False):
+        with open(path, "r", newline="") as file:
+            rows = list(csv.reader(file))[1:]
+        return cls(trace=[tuple(float(value) for value in row) for row in rows], repeat=repeat)
+
+    def at(self, t):
+        if self.function is not None:
+            return self.function(t)
+        if self.repeat and self.times[-1] > 0:
+            t = t % self.times[-1]
+        i = max(0, bisect.bisect_right(self.times, t) - 1)
+        row = self.trace[i]
+        return row[1] if len(row) == 2 else row[1:]
+
+# sample read() rate times a second for duration seconds into a CSV trace, e.g. on the
+# Pi: record_trace(lambda: sensor.distance, "centre.csv", 20, 60)
+def record_trace(read, path, rate, duration, names=("value",)):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("time",) + tuple(names))
+        start = time.perf_counter()
+        for i in range(int(duration * rate)):
+            time.sleep(max(0.0, start + i / rate - time.perf_counter()))
+            value = read()
+            writer.writerow((time.perf_counter() - start,) + (tuple(value) if isinstance(value, (tuple, list)) else (value,)))
+
+# calls update(t) rate times a second from a daemon thread until stopped
+class Sampler:
+    def __init__(self, update, rate):
+        self.update = update
+        self.rate = rate
+        self.stopped = threading.Event()
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        i = 0
+        while not self.stopped.is_set():
+            self.update(i / self.rate)
+            i += 1
+            self.stopped.wait(max(0.0, self.start_time + i / self.rate - time.perf_counter()))
+
+    def stop(self):
+        self.stopped.set()
+
+# a continuous rotation servo: value is the speed from -1 to 1, None once detached
+class SimulatedServo:
+    def __init__(self, pin=None):
+        self.pin = pin
+        self._value = None
+        self.history = [] # (time.perf_counter(), value)
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = None if value is None else max(-1.0, min(1.0, value))
+        self.history.append((time.perf_counter(), self._value))
+
+    def detach(self):
+        self.value = None
+
+    def close(self):
+        self.detach()
+
+# an HC-SR04 style distance sensor, reading in m like gpiozero. The reading is set by
+# the test, or sampled from signal rate times a second. It calls when_in_range /
+# when_out_of_range when the reading crosses threshold_distance, from whatever thread
+# set it, as gpiozero does from its own. read_latency makes every read block that long,
+# and callbacks=False leaves out when_in_range so the control code has to poll
+class SimulatedDistanceSensor:
+    def __init__(self, trigger=None, echo=None, max_distance=1, threshold_distance=0.3, distance=None, signal=None, rate=SENSOR_RATE, read_latency=0, callbacks=True):
+        self.trigger = trigger
+        self.echo = echo
+        self.max_distance = max_distance
+        self.threshold_distance = threshold_distance
+        if callbacks:
+            self.when_in_range = None
+            self.when_out_of_range = None
+        self.read_latency = read_latency
+        self._distance = max_distance if distance is None else distance
+        self.changed_at = None # time.perf_counter() of the last change
+        self.timers = []
+        self.sampler = Sampler(lambda t: setattr(self, "distance", signal.at(t)), rate) if signal is not None else None
+
+    @property
+    def distance(self):
+        if self.read_latency:
+            time.sleep(self.read_latency)
+        return self._distance
+
+    @distance.setter
+    def distance(self, distance):
+        was_in_range = self._distance < self.threshold_distance
+        distance = max(0.0, min(self.max_distance, distance))
+        if distance != self._distance:
+            self._distance = distance
+            self.changed_at = time.perf_counter()
+
+        in_range = self._distance < self.threshold_distance
+        if in_range and not was_in_range and getattr(self, "when_in_range", None):
+            self.when_in_range()
+        elif was_in_range and not in_range and getattr(self, "when_out_of_range", None):
+            self.when_out_of_range()
+
+    # set the reading after delay seconds, from a timer thread like a real echo would arrive
+    def set_distance_after(self, delay, distance):
+        timer = threading.Timer(delay, setattr, args=(self, "distance", distance))
+        timer.daemon = True
+        timer.start()
+        self.timers.append(timer)
+
+    def close(self):
+        for timer in self.timers:
+            timer.cancel()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+# MPU6050 registers as gyroscope.py reads them: signal gives (accel x, y, z in g,
+# gyro x, y, z in deg/s), lying flat and still by default. Readings change rate times a second
+class SimulatedMPU6050:
+    ACCEL_REGISTER = 0x3b
+    GYRO_REGISTER = 0x43
+    ACCEL_SCALE = 16384.0 # raw units per g at +-2 g
+    GYRO_SCALE = 131.0 # raw units per deg/s at +-250 deg/s
+
+    def __init__(self, signal=None, rate=MPU6050_RATE):
+        self.signal = signal or Signal.constant((0.0, 0.0, 1.0, 0.0, 0.0, 0.0))
+        self.rate = rate
+        self.registers = {0x6b: 0x40} # power management 1, asleep after power on
+        self.start_time = time.perf_counter()
+
+    def sample(self):
+        t = math.floor((time.perf_counter() - self.start_time) * self.rate) / self.rate
+        return self.signal.at(t)
+
+    def read_register(self, register):
+        ax, ay, az, gx, gy, gz = self.sample()
+        for base, values, scale in ((self.ACCEL_REGISTER, (ax, ay, az), self.ACCEL_SCALE), (self.GYRO_REGISTER, (gx, gy, gz), self.GYRO_SCALE)):
+            if base <= register < base + 6:
+                raw = max(-32768, min(32767, round(values[(register - base) // 2] * scale))) & 0xffff
+                return raw >> 8 if (register - base) % 2 == 0 else raw & 0xff
+        return self.registers.get(register, 0)
+
+    def write_register(self, register, value):
+        self.registers[register] = value & 0xff
+
+# smbus.SMBus with simulated devices at their addresses, every transfer takes latency seconds
+class SimulatedSMBus:
+    def __init__(self, bus=1, devices=None, latency=0):
+        self.bus = bus
+        self.devices = devices if devices is not None else {0x68: SimulatedMPU6050()}
+        self.latency = latency
+
+    def device(self, address):
+        if self.latency:
+            time.sleep(self.latency)
+        if address not in self.devices:
+            raise OSError(121, "Remote I/O error") # what smbus raises when nothing answers
+        return self.devices[address]
+
+    def read_byte_data(self, address, register):
+        return self.device(address).read_register(register)
+
+    def write_byte_data(self, address, register, value):
+        self.device(address).write_register(register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+        device = self.device(address)
+        return [device.read_register(register + i) for i in range(length)]
+
+    def close(self):
+        pass
+
+# a TF-Luna data frame: header, distance in cm, signal strength, temperature, checksum
+def tf_luna_frame(distance, strength=1000, temperature=40.0):
+    distance_cm = max(0, min(65535, round(distance * 100)))
+    temperature_raw = max(0, min(65535, round((temperature + 256.0) * 8)))
+    frame = bytes([0x59, 0x59, distance_cm & 0xff, distance_cm >> 8, strength & 0xff, strength >> 8, temperature_raw & 0xff, temperature_raw >> 8])
+    return frame + bytes([sum(frame) & 0xff])
+
+# serial.Serial with a TF-Luna on the other end: 9 byte frames rate times a second,
+# signal gives the distance in m (or (distance in m, strength, temperature in C)).
+# Frames are made when the port is looked at, for the time that passed since
+class SimulatedSerial:
+    def __init__(self, port=None, baudrate=115200, timeout=None, signal=None, rate=TF_LUNA_RATE):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.signal = signal or Signal.constant(1.0)
+        self.rate = rate
+        self.buffer = bytearray()
+        self.frames_sent = 0
+        self.is_open = True
+        self.start_time = time.perf_counter()
+
+    def update(self):
+        due = math.floor((time.perf_counter() - self.start_time) * self.rate)
+        # only the frames that still fit in the buffer matter
+        first = max(self.frames_sent, due - SERIAL_BUFFER_SIZE // 9)
+        for i in range(first, due):
+            value = self.signal.at(i / self.rate)
+            self.buffer += tf_luna_frame(*value) if isinstance(value, tuple) else tf_luna_frame(value)
+        self.frames_sent = due
+        del self.buffer[:-SERIAL_BUFFER_SIZE]
+
+    @property
+    def in_waiting(self):
+        self.update()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self.update()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self.update()
+        self.buffer.clear()
+
+    def isOpen(self):
+        return self.is_open
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
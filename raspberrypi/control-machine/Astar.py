@@ -1,26 +1,73 @@
 import heapq
 import math
 
-
+# Cells are numbered by their position in a flat grid with a one cell border of
+# walls around the map, so the search works on plain ints and preallocated lists
+# instead of tuples, dicts and sets, and never needs a bounds check. The ids grow
+# with (r, c) like the tuples did, so ordering the heap by (f, id) breaks ties the
+# same way and the paths match the tuple version.
+BLOCKED = 1 << 62
+
+SEARCHES = ("astar", "jps")
+SQRT_2 = math.sqrt(2)
+
+
+# search="jps" runs Jump Point Search instead of plain A*: on uniform-cost grids it
+# skips over runs of cells that every optimal path would cross the same way and only
+# puts the cells where the path may have to turn ("jump points") on the heap. The
+# returned path still lists every cell, so find_directions works the same.
+# connectivity=8 (jps only) also moves diagonally, never cutting an obstacle's
+# corner, find_directions only understands 4-connected paths though.
 class Astar:
-    def __init__(self, row, col, obstacles, start, dest):
+    def __init__(
+        self, row, col, obstacles, start, dest, search="astar", connectivity=4
+    ):
+        if search not in SEARCHES:
+            raise ValueError(f"Unknown search: {search}")
+        if connectivity not in (4, 8) or (search == "astar" and connectivity != 4):
+            raise ValueError(f"Unsupported connectivity for {search}: {connectivity}")
+
         self.row = row
         self.col = col
         self.start = start
         self.dest = dest
         self.obstacles = set(obstacles)
-
-        self.g_score = {}
-        self.f_score = {}
-        self.closed = set()
+        self.search = search
+        self.connectivity = connectivity
+
+        # one stamp per cell: a search marks the cells it has seen with
+        # 2 * generation and the ones it has closed with 2 * generation + 1, walls
+        # are above any stamp. clear() only bumps the generation, nothing is
+        # reallocated or reset between searches
+        self.width = col + 2
+        size = (row + 2) * self.width
+        self.stamp = [0] * size
+        self.stamp[: self.width] = [BLOCKED] * self.width
+        self.stamp[size - self.width :] = [BLOCKED] * self.width
+        self.stamp[:: self.width] = [BLOCKED] * (row + 2)
+        self.stamp[self.width - 1 :: self.width] = [BLOCKED] * (row + 2)
+        for r, c in self.obstacles:
+            if self.in_bounds(r, c):
+                self.stamp[self.node_id((r, c))] = BLOCKED
+
+        self.g_score = [0] * size
+        self.came_from = [-1] * size
+        self.generation = 0
         self.open = []
 
         # TODO: initially, we are just going to assume initial north bearing
         self.orientation = "N"
-        self.came_from = {}
 
         self.path = []
 
+    def node_id(self, cell):
+        r, c = cell
+        return (r + 1) * self.width + c + 1
+
+    def cell(self, node):
+        r, c = divmod(node, self.width)
+        return (r - 1, c - 1)
+
     def euclidean_distance(self, curr, dest):
         x, y = curr
         dest_x, dest_y = dest
@@ -31,16 +78,23 @@ class Astar:
         return math.sqrt(delta_x**2 + delta_y**2)
 
     def reconstruct_path(self, current):
-        path = [current]
-        while current in self.came_from:
-            current = self.came_from[current]
-            path.append(current)
+        node = self.node_id(current)
+        path = []
+        while node != -1:
+            path.append(self.cell(node))
+            node = self.came_from[node]
         path.reverse()
         return path
 
+    def in_bounds(self, r, c):
+        return 0 <= r < self.row and 0 <= c < self.col
+
     def is_obstacle(self, r, c):
         return (r, c) in self.obstacles
 
+    def is_closed(self, r, c):
+        return self.stamp[self.node_id((r, c))] == 2 * self.generation + 1
+
     def available_neighbors(self, curr):
         # down, right, up, left
         # no diagonals
@@ -55,107 +109,320 @@ class Astar:
             ccal = c + cdir
 
             if (
-                0 <= ccal < self.col
-                and 0 <= rcal < self.row
+                self.in_bounds(rcal, ccal)
                 and not self.is_obstacle(rcal, ccal)
-                and (rcal, ccal) not in self.closed
+                and not self.is_closed(rcal, ccal)
             ):
                 neighbors.append((rcal, ccal))
 
         return neighbors
 
     def clear(self):
-        self.g_score = {}
-        self.f_score = {}
-        self.closed = set()
+        self.generation += 1
         self.open = []
-        self.came_from = {}
         self.path = []
 
     def find_path(self):
         self.clear()
 
-        starting_h_score = self.euclidean_distance(self.start, self.dest)
-        starting_g_score = 0
-        starting_f_score = starting_h_score + starting_g_score
+        if not (self.in_bounds(*self.start) and self.in_bounds(*self.dest)):
+            return []
+        if self.search == "jps":
+            return self.find_path_jps()
+
+        # locals for the hot loop
+        width = self.width
+        stamp = self.stamp
+        g_score = self.g_score
+        came_from = self.came_from
+        seen_stamp = 2 * self.generation
+        closed_stamp = seen_stamp + 1
+        dest = self.node_id(self.dest)
+        dest_r, dest_c = divmod(dest, width)
+        sqrt = math.sqrt
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        start = self.node_id(self.start)
+        g_score[start] = 0
+        came_from[start] = -1
+        if stamp[start] != BLOCKED:
+            stamp[start] = seen_stamp
+
+        open_heap = self.open
+        open_heap.append((self.euclidean_distance(self.start, self.dest), start))
+
+        while open_heap:
+            curr = heappop(open_heap)[1]
+
+            # a cell is pushed again whenever its g-score improves, the older entries are stale
+            if stamp[curr] == closed_stamp:
+                continue
+            if stamp[curr] != BLOCKED:
+                stamp[curr] = closed_stamp
+
+            if curr == dest:
+                self.path = self.reconstruct_path(self.dest)
+                return self.path
 
-        self.g_score[self.start] = 0
-        self.f_score[self.start] = starting_f_score
+            neighbors_cost = g_score[curr] + 1
+            r, c = divmod(curr, width)
+            delta_r = dest_r - r
+            delta_c = dest_c - c
+
+            # down, right, up, left, same order as available_neighbors
+            for neighbor, h_r, h_c in (
+                (curr + 1, delta_r, delta_c - 1),
+                (curr + width, delta_r - 1, delta_c),
+                (curr - 1, delta_r, delta_c + 1),
+                (curr - width, delta_r + 1, delta_c),
+            ):
+                neighbor_stamp = stamp[neighbor]
+                # walls and closed cells, or seen already at no higher cost
+                if neighbor_stamp > seen_stamp or (
+                    neighbor_stamp == seen_stamp and g_score[neighbor] <= neighbors_cost
+                ):
+                    continue
+
+                stamp[neighbor] = seen_stamp
+                came_from[neighbor] = curr
+                g_score[neighbor] = neighbors_cost
+                f_score = sqrt(h_r * h_r + h_c * h_c) + neighbors_cost
+                heappush(open_heap, (f_score, neighbor))
+
+        return []
 
-        self.open = [(starting_f_score, self.start)]
-        heapq.heapify(self.open)
+    def find_path_jps(self):
+        width = self.width
+        stamp = self.stamp
+        g_score = self.g_score
+        came_from = self.came_from
+        seen_stamp = 2 * self.generation
+        closed_stamp = seen_stamp + 1
+        dest = self.node_id(self.dest)
+        jump = self.jump_8 if self.connectivity == 8 else self.jump_4
+
+        start = self.node_id(self.start)
+        g_score[start] = 0
+        came_from[start] = -1
+        if stamp[start] != BLOCKED:
+            stamp[start] = seen_stamp
+
+        self.open = [(self.jps_distance(start, dest), start)]
 
         while self.open:
             curr = heapq.heappop(self.open)[1]
 
-            self.closed.add(curr)
+            if stamp[curr] == closed_stamp:
+                continue
+            if stamp[curr] != BLOCKED:
+                stamp[curr] = closed_stamp
 
-            if curr == self.dest:
-                self.path = self.reconstruct_path(curr)
+            if curr == dest:
+                self.path = self.expand_jump_points(dest)
                 return self.path
 
-            neighbors = self.available_neighbors(curr)
+            for d_r, d_c in self.jps_directions(curr):
+                jump_point = jump(curr + d_r * width + d_c, d_r, d_c)
+                if jump_point == -1 or stamp[jump_point] == closed_stamp:
+                    continue
+
+                cost = g_score[curr] + self.jps_distance(curr, jump_point)
+                if stamp[jump_point] != seen_stamp or g_score[jump_point] > cost:
+                    stamp[jump_point] = seen_stamp
+                    came_from[jump_point] = curr
+                    g_score[jump_point] = cost
+                    f_score = cost + self.jps_distance(jump_point, dest)
+                    heapq.heappush(self.open, (f_score, jump_point))
+
+        return []
+
+    # exact distance between two cells on a straight or diagonal line, and an
+    # admissible heuristic otherwise (manhattan for 4-connected, octile for 8)
+    def jps_distance(self, node, other):
+        r, c = divmod(node, self.width)
+        other_r, other_c = divmod(other, self.width)
+        delta_r, delta_c = abs(other_r - r), abs(other_c - c)
+        if self.connectivity == 4:
+            return delta_r + delta_c
+        return max(delta_r, delta_c) + (SQRT_2 - 1) * min(delta_r, delta_c)
+
+    def walkable(self, node):
+        return self.stamp[node] != BLOCKED
+
+    # directions worth searching from node given the direction we reached it from,
+    # the rest are covered just as well by a path that doesn't go through node
+    def jps_directions(self, node):
+        walkable = self.walkable
+        width = self.width
+        parent = self.came_from[node]
+
+        if parent == -1:
+            straight = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+            if self.connectivity == 4:
+                return straight
+            diagonal = [
+                (d_r, d_c)
+                for d_r, d_c in ((1, 1), (1, -1), (-1, 1), (-1, -1))
+                if walkable(node + d_r * width) and walkable(node + d_c)
+            ]
+            return straight + diagonal
+
+        r, c = divmod(node, width)
+        parent_r, parent_c = divmod(parent, width)
+        d_r = (r > parent_r) - (r < parent_r)
+        d_c = (c > parent_c) - (c < parent_c)
+
+        if d_r and d_c:
+            directions = [(d_r, 0), (0, d_c)]
+            if walkable(node + d_r * width) and walkable(node + d_c):
+                directions.append((d_r, d_c))
+            return directions
+
+        # straight on, and turning either way (a turn is only needed around a wall,
+        # but the wall may have been passed between two jump points)
+        if d_c:
+            sides = [(1, 0), (-1, 0)]
+            ahead = node + d_c
+        else:
+            sides = [(0, 1), (0, -1)]
+            ahead = node + d_r * width
+        directions = [(d_r, d_c)] + sides
+        if self.connectivity == 8 and walkable(ahead):
+            directions += [
+                (d_r or side_r, d_c or side_c)
+                for side_r, side_c in sides
+                if walkable(node + side_r * width + side_c)
+            ]
+        return directions
 
-            neighbors_cost = self.g_score[curr] + 1
+    # first jump point from node onwards in a straight line, -1 if a wall comes first
+    def jump_4(self, node, d_r, d_c):
+        stamp = self.stamp
+        dest = self.node_id(self.dest)
+        step = d_r * self.width + d_c
+        sides = (1, -1) if d_r else (self.width, -self.width)
 
-            for neighbor in neighbors:
+        while stamp[node] != BLOCKED:
+            if node == dest:
+                return node
+
+            # forced neighbor: a side cell that could only be reached through node
+            # because the cell beside the one we came from is a wall
+            for side in sides:
                 if (
-                    neighbor not in self.g_score
-                    or self.g_score[neighbor] > neighbors_cost
+                    stamp[node + side] != BLOCKED
+                    and stamp[node - step + side] == BLOCKED
                 ):
-                    self.came_from[neighbor] = curr
-                    self.g_score[neighbor] = neighbors_cost
-                    self.f_score[neighbor] = (
-                        self.euclidean_distance(neighbor, self.dest)
-                        + self.g_score[neighbor]
-                    )
-                    heapq.heappush(self.open, (self.f_score[neighbor], neighbor))
+                    return node
 
-        return []
+            # moving vertically, a jump point to either side makes node one too
+            if d_r and (
+                self.jump_4(node + 1, 0, 1) != -1 or self.jump_4(node - 1, 0, -1) != -1
+            ):
+                return node
+
+            node += step
+
+        return -1
+
+    # 8-connected version: diagonal moves check both straight directions they
+    # combine at every step, and stop where the diagonal would cut a corner
+    def jump_8(self, node, d_r, d_c):
+        stamp = self.stamp
+        width = self.width
+        dest = self.node_id(self.dest)
+        step = d_r * width + d_c
+
+        while stamp[node] != BLOCKED:
+            if node == dest:
+                return node
+
+            if d_r and d_c:
+                if (
+                    self.jump_8(node + d_c, 0, d_c) != -1
+                    or self.jump_8(node + d_r * width, d_r, 0) != -1
+                ):
+                    return node
+                if stamp[node + d_c] == BLOCKED or stamp[node + d_r * width] == BLOCKED:
+                    return -1
+            else:
+                sides = (1, -1) if d_r else (width, -width)
+                for side in sides:
+                    if (
+                        stamp[node + side] != BLOCKED
+                        and stamp[node - step + side] == BLOCKED
+                    ):
+                        return node
+
+            node += step
+
+        return -1
+
+    # every cell on the way from the start to node, filling in the straight and
+    # diagonal runs between consecutive jump points
+    def expand_jump_points(self, node):
+        jump_points = self.reconstruct_path(self.cell(node))
+
+        path = jump_points[:1]
+        for next_r, next_c in jump_points[1:]:
+            r, c = path[-1]
+            d_r = (next_r > r) - (next_r < r)
+            d_c = (next_c > c) - (next_c < c)
+            while (r, c) != (next_r, next_c):
+                r, c = r + d_r, c + d_c
+                path.append((r, c))
+        return path
 
     def find_directions(self):
         if not self.path:
             print("Path is not defined, invoke find path function")
             return
 
-        # Orientation mapping
-        # from North, a left turn means we go west for example
-        left_turns = {"N": "W", "W": "S", "S": "E", "E": "N"}
-        right_turns = {"N": "E", "E": "S", "S": "W", "W": "N"}
-
-        directions = []
-
-        for i in range(len(self.path) - 1):
-            cur_x, cur_y = self.path[i]
-            next_x, next_y = self.path[i + 1]
-
-            if cur_x < next_x:
-                desired_orientation = "E"
-            elif cur_x > next_x:
-                desired_orientation = "W"
-            elif cur_y < next_y:
-                desired_orientation = "S"
-            elif cur_y > next_y:
-                desired_orientation = "N"
-
-            # Adjust orientation to the desired one
-            while self.orientation != desired_orientation:
-
-                one_left_from_desired = (
-                    self.orientation == left_turns[desired_orientation]
-                )
-                two_rights_from_desired = (
-                    self.orientation == right_turns[right_turns[desired_orientation]]
-                )
-
-                if one_left_from_desired or two_rights_from_desired:
-                    directions.append("R")
-                    self.orientation = right_turns[self.orientation]
-                else:
-                    directions.append("L")
-                    self.orientation = left_turns[self.orientation]
-
-            # Move forward
-            directions.append("F")
-
+        directions, self.orientation = path_directions(self.path, self.orientation)
         return directions
+
+
+# the turns and moves that drive path from its first cell facing orientation,
+# and the orientation it ends on. Only depends on its arguments, so the same path
+# from the same heading always gives the same commands
+def path_directions(path, orientation="N"):
+    # Orientation mapping
+    # from North, a left turn means we go west for example
+    left_turns = {"N": "W", "W": "S", "S": "E", "E": "N"}
+    right_turns = {"N": "E", "E": "S", "S": "W", "W": "N"}
+
+    directions = []
+
+    for i in range(len(path) - 1):
+        cur_x, cur_y = path[i]
+        next_x, next_y = path[i + 1]
+
+        if cur_x < next_x:
+            desired_orientation = "E"
+        elif cur_x > next_x:
+            desired_orientation = "W"
+        elif cur_y < next_y:
+            desired_orientation = "S"
+        elif cur_y > next_y:
+            desired_orientation = "N"
+
+        # Adjust orientation to the desired one
+        while orientation != desired_orientation:
+
+            one_left_from_desired = orientation == left_turns[desired_orientation]
+            two_rights_from_desired = (
+                orientation == right_turns[right_turns[desired_orientation]]
+            )
+
+            if one_left_from_desired or two_rights_from_desired:
+                directions.append("R")
+                orientation = right_turns[orientation]
+            else:
+                directions.append("L")
+                orientation = left_turns[orientation]
+
+        # Move forward
+        directions.append("F")
+
+    return directions, orientation
@@ -0,0 +1,209 @@
+import itertools
+import math
+from Astar import *
+
+# visiting orders for more targets than this are approximated
+EXACT_ORDER_MAX_TARGETS = 12
+
+
+# Distance from one cell (e.g. the dock) to every other cell of the grid, from a
+# single breadth first search (4-connected, every move costs 1). Each cell keeps the
+# neighbor it was reached from, so a shortest path between the source and any cell
+# is read back in time proportional to its length, without searching again. Moves
+# cost the same both ways, so the same field serves paths towards the source.
+#
+#   field = DistanceField(row, col, obstacles, dock)
+#   field.path_to(target), field.path_from(target), field.directions_to(target)
+class DistanceField(Astar):
+    def __init__(self, row, col, obstacles, source):
+        super().__init__(row, col, obstacles, source, None)
+        self.source = source
+
+        size = len(self.stamp)
+        self.distance_to = [-1] * size  # -1 for cells the source can't reach
+        self.came_from = [-1] * size
+        if self.in_bounds(*source) and self.stamp[self.node_id(source)] != BLOCKED:
+            self.breadth_first_search(self.node_id(source))
+
+    def breadth_first_search(self, source):
+        width = self.width
+        stamp = self.stamp
+        distance_to = self.distance_to
+        came_from = self.came_from
+
+        distance_to[source] = 0
+        frontier = [source]
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for node in frontier:
+                # down, right, up, left, same order as Astar
+                for neighbor in (node + 1, node + width, node - 1, node - width):
+                    if distance_to[neighbor] == -1 and stamp[neighbor] != BLOCKED:
+                        distance_to[neighbor] = distance
+                        came_from[neighbor] = node
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+
+    # number of moves between the source and cell, None if there is no path
+    def distance(self, cell):
+        if not self.in_bounds(*cell):
+            return None
+        distance = self.distance_to[self.node_id(cell)]
+        return None if distance == -1 else distance
+
+    # shortest path from the source to cell, [] if there is none
+    def path_to(self, cell):
+        if self.distance(cell) is None:
+            return []
+        return self.reconstruct_path(cell)
+
+    # shortest path from cell to the source
+    def path_from(self, cell):
+        return self.path_to(cell)[::-1]
+
+    # find_directions for the path from the source to cell, starting out facing orientation
+    def directions_to(self, cell, orientation="N"):
+        self.path = self.path_to(cell)
+        self.orientation = orientation
+        return self.find_directions()
+
+    def directions_from(self, cell, orientation="N"):
+        self.path = self.path_from(cell)
+        self.orientation = orientation
+        return self.find_directions()
+
+
+# distances between every pair of cells (math.inf if one can't reach the other),
+# and the distance field of each cell to read the paths back from
+def distance_matrix(row, col, obstacles, cells):
+    fields = [DistanceField(row, col, obstacles, cell) for cell in cells]
+    matrix = [
+        [
+            math.inf if field.distance(cell) is None else field.distance(cell)
+            for cell in cells
+        ]
+        for field in fields
+    ]
+    return matrix, fields
+
+
+# shortest order to visit every target from the start (index 0 of the matrix),
+# returns the target indices (1..n) in visiting order and the total distance
+def solve_visiting_order(matrix, return_to_start=False):
+    targets = list(range(1, len(matrix)))
+    if len(targets) <= EXACT_ORDER_MAX_TARGETS:
+        return held_karp(matrix, targets, return_to_start)
+    return two_opt(matrix, nearest_neighbor(matrix, targets), return_to_start)
+
+
+def route_cost(matrix, order, return_to_start):
+    stops = [0] + list(order) + ([0] if return_to_start else [])
+    return sum(matrix[a][b] for a, b in zip(stops, stops[1:]))
+
+
+# exact dynamic programming over subsets of targets: O(2^n * n^2)
+def held_karp(matrix, targets, return_to_start):
+    if not targets:
+        return [], 0
+
+    # best[(subset, last)] = (cost of starting at 0, visiting subset and ending at last, previous target)
+    best = {}
+    for i, target in enumerate(targets):
+        best[(1 << i, i)] = (matrix[0][target], None)
+
+    for size in range(2, len(targets) + 1):
+        for subset in itertools.combinations(range(len(targets)), size):
+            bits = sum(1 << i for i in subset)
+            for last in subset:
+                previous_bits = bits & ~(1 << last)
+                best[(bits, last)] = min(
+                    (
+                        best[(previous_bits, previous)][0]
+                        + matrix[targets[previous]][targets[last]],
+                        previous,
+                    )
+                    for previous in subset
+                    if previous != last
+                )
+
+    full = (1 << len(targets)) - 1
+    cost, last = min(
+        (
+            best[(full, last)][0]
+            + (matrix[targets[last]][0] if return_to_start else 0),
+            last,
+        )
+        for last in range(len(targets))
+    )
+
+    order = []
+    bits = full
+    while last is not None:
+        order.append(targets[last])
+        bits, last = bits & ~(1 << last), best[(bits, last)][1]
+    order.reverse()
+    return order, cost
+
+
+# greedy starting order for larger problems: always go to the closest unvisited target
+def nearest_neighbor(matrix, targets):
+    order = []
+    remaining = set(targets)
+    current = 0
+    while remaining:
+        current = min(remaining, key=lambda target: (matrix[current][target], target))
+        order.append(current)
+        remaining.remove(current)
+    return order
+
+
+# reverse segments of the order while that makes the route shorter
+def two_opt(matrix, order, return_to_start):
+    best_cost = route_cost(matrix, order, return_to_start)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i : j + 1][::-1] + order[j + 1 :]
+                cost = route_cost(matrix, candidate, return_to_start)
+                if cost < best_cost:
+                    order, best_cost = candidate, cost
+                    improved = True
+    return order, best_cost
+
+
+# Delivery run: visit every target from start in the shortest order, one breadth
+# first search per stop. Targets that can't be reached are left out of the route.
+# Returns the targets in visiting order, the total distance, the full path and
+# find_directions-style commands for it
+def plan_route(
+    row, col, obstacles, start, targets, return_to_start=False, orientation="N"
+):
+    cells = [start] + list(targets)
+    matrix, fields = distance_matrix(row, col, obstacles, cells)
+
+    reachable = [0] + [i for i in range(1, len(cells)) if matrix[0][i] != math.inf]
+    unreachable = [cells[i] for i in range(1, len(cells)) if matrix[0][i] == math.inf]
+    sub_matrix = [[matrix[a][b] for b in reachable] for a in reachable]
+    order, cost = solve_visiting_order(sub_matrix, return_to_start)
+    stops = [0] + [reachable[i] for i in order] + ([0] if return_to_start else [])
+
+    path = [start]
+    for a, b in zip(stops, stops[1:]):
+        path += fields[a].path_to(cells[b])[1:]
+
+    # find_directions only looks at the path and the orientation, any field can turn the route into commands
+    fields[0].path = path
+    fields[0].orientation = orientation
+    directions = fields[0].find_directions() if len(path) > 1 else []
+
+    return {
+        "order": [cells[i] for i in stops[1:]],
+        "distance": cost,
+        "path_coords": path,
+        "directions": directions,
+        "unreachable": unreachable,
+    }
@@ -0,0 +1,170 @@
+import heapq
+import math
+from Astar import *
+
+
+# D* Lite (Koenig & Likhachev 2002): searches backwards from the destination and
+# keeps its search tree between calls, so when obstacles show up or disappear only
+# the cells whose distance to the destination changed are searched again instead
+# of planning from scratch. Uses the same grid, cell ids and find_directions as
+# Astar (4-connected, every move costs 1).
+#
+#   planner = DstarLite(row, col, obstacles, start, dest)
+#   planner.find_path()
+#   planner.move_to(cell)                       # the robot got this far
+#   planner.update_obstacles(added=[cell])      # a sensor saw something
+#   planner.find_path(), planner.find_directions()
+class DstarLite(Astar):
+    def __init__(self, row, col, obstacles, start, dest):
+        super().__init__(row, col, obstacles, start, dest)
+
+        # g_score is the distance to the destination as of the last expansion,
+        # rhs the one-step lookahead from the neighbors' g, cells where the two
+        # differ are queued. g_score and rhs are only ever infinite or exact
+        size = len(self.stamp)
+        self.g_score = [math.inf] * size
+        self.rhs = [math.inf] * size
+        # cell id -> current key, heap entries with another key are stale
+        self.queued = {}
+        self.open = []
+
+        # the keys are relative to the robot's cell, km makes up for the robot
+        # moving so keys already in the heap stay lower bounds
+        self.km = 0
+        self.last_start = self.node_id(start)
+
+        self.expanded = 0  # cells expanded by the last find_path
+
+        dest_node = self.node_id(dest)
+        self.rhs[dest_node] = 0
+        self.queue(dest_node)
+
+    def heuristic(self, node, other):
+        r, c = divmod(node, self.width)
+        other_r, other_c = divmod(other, self.width)
+        return abs(r - other_r) + abs(c - other_c)
+
+    def key(self, node):
+        best = min(self.g_score[node], self.rhs[node])
+        return (best + self.heuristic(self.node_id(self.start), node) + self.km, best)
+
+    def queue(self, node):
+        key = self.key(node)
+        self.queued[node] = key
+        heapq.heappush(self.open, (key, node))
+
+    def neighbors(self, node):
+        return (node + 1, node + self.width, node - 1, node - self.width)
+
+    def update_vertex(self, node):
+        if node != self.node_id(self.dest):
+            if self.stamp[node] == BLOCKED:
+                self.rhs[node] = math.inf
+            else:
+                best = math.inf
+                for neighbor in self.neighbors(node):
+                    if (
+                        self.stamp[neighbor] != BLOCKED
+                        and self.g_score[neighbor] < best
+                    ):
+                        best = self.g_score[neighbor]
+                self.rhs[node] = best + 1
+
+        if self.g_score[node] != self.rhs[node]:
+            self.queue(node)
+        else:
+            self.queued.pop(node, None)
+
+    # smallest key still queued, dropping stale heap entries on the way
+    def top(self):
+        while self.open:
+            key, node = self.open[0]
+            if self.queued.get(node) == key:
+                return key, node
+            heapq.heappop(self.open)
+        return None
+
+    def compute_shortest_path(self):
+        start = self.node_id(self.start)
+        g_score = self.g_score
+        rhs = self.rhs
+        self.expanded = 0
+
+        while True:
+            top = self.top()
+            if top is None:
+                break
+            old_key, node = top
+            if not (old_key < self.key(start) or rhs[start] != g_score[start]):
+                break
+
+            heapq.heappop(self.open)
+            del self.queued[node]
+            self.expanded += 1
+
+            new_key = self.key(node)
+            if old_key < new_key:
+                self.queued[node] = new_key
+                heapq.heappush(self.open, (new_key, node))
+            elif g_score[node] > rhs[node]:
+                g_score[node] = rhs[node]
+                for neighbor in self.neighbors(node):
+                    self.update_vertex(neighbor)
+            else:
+                g_score[node] = math.inf
+                self.update_vertex(node)
+                for neighbor in self.neighbors(node):
+                    self.update_vertex(neighbor)
+
+    def find_path(self):
+        self.path = []
+        if not (self.in_bounds(*self.start) and self.in_bounds(*self.dest)):
+            return []
+
+        self.compute_shortest_path()
+
+        node = self.node_id(self.start)
+        if self.g_score[node] == math.inf:
+            return []
+
+        # walk downhill in g_score, ties go to the first neighbor in Astar's order
+        dest = self.node_id(self.dest)
+        path = [self.start]
+        while node != dest:
+            node = min(
+                (n for n in self.neighbors(node) if self.stamp[n] != BLOCKED),
+                key=lambda n: self.g_score[n],
+            )
+            path.append(self.cell(node))
+
+        self.path = path
+        return path
+
+    # the robot has moved to cell, later paths start from there
+    def move_to(self, cell, orientation=None):
+        node = self.node_id(cell)
+        self.km += self.heuristic(self.last_start, node)
+        self.last_start = node
+        self.start = cell
+        if orientation is not None:
+            self.orientation = orientation
+
+    # cells that became obstacles or free, only their neighborhood is queued again
+    def update_obstacles(self, added=(), removed=()):
+        changed = []
+        for r, c in added:
+            if self.in_bounds(r, c) and (r, c) not in self.obstacles:
+                self.obstacles.add((r, c))
+                self.stamp[self.node_id((r, c))] = BLOCKED
+                changed.append(self.node_id((r, c)))
+        for r, c in removed:
+            if self.in_bounds(r, c) and (r, c) in self.obstacles:
+                self.obstacles.remove((r, c))
+                self.stamp[self.node_id((r, c))] = 0
+                changed.append(self.node_id((r, c)))
+
+        for node in changed:
+            self.update_vertex(node)
+            for neighbor in self.neighbors(node):
+                if self.stamp[neighbor] != BLOCKED:
+                    self.update_vertex(neighbor)
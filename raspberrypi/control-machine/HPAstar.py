@@ -0,0 +1,356 @@
+import hashlib
+import json
+import heapq
+from collections import deque
+from Astar import *
+
+CLUSTER_SIZE = 10
+ENTRANCE_SPLIT = 6  # border openings at least this wide get an entrance at each end instead of one in the middle
+
+
+# Hierarchical path planning (HPA*, Botea et al. 2004): the grid is split into
+# square clusters, and the cells where paths can cross from one cluster into the
+# next ("entrances") become the nodes of a small abstract graph. Distances between
+# the entrances of a cluster are worked out once, so a query only searches the
+# abstract graph and then fills in the cells one cluster at a time. Paths are
+# near-optimal (they go through entrances), not always the shortest.
+#
+# The abstract graph can be saved with a map (to_dict/from_dict) and is kept up to
+# date by update_obstacles, which only recomputes the clusters next to the edit.
+class HPAstar(Astar):
+    def __init__(
+        self,
+        row,
+        col,
+        obstacles,
+        start=None,
+        dest=None,
+        cluster_size=CLUSTER_SIZE,
+        build=True,
+    ):
+        super().__init__(row, col, obstacles, start, dest)
+        self.cluster_size = cluster_size
+        self.cluster_rows = -(-row // cluster_size)
+        self.cluster_cols = -(-col // cluster_size)
+
+        # (cluster, neighbor cluster) -> [(cell in cluster, cell in neighbor), ...]
+        self.borders = {}
+        self.cluster_edges = {}  # cluster -> {entrance: [(entrance, cost), ...]}
+        self.recomputed = set()  # clusters recomputed by the last build or update
+
+        if build:
+            self.build()
+
+    def clusters(self):
+        return [
+            (i, j) for i in range(self.cluster_rows) for j in range(self.cluster_cols)
+        ]
+
+    def cluster_of(self, cell):
+        r, c = cell
+        return (r // self.cluster_size, c // self.cluster_size)
+
+    # cells [r0, r1) x [c0, c1) of a cluster
+    def bounds(self, cluster):
+        i, j = cluster
+        size = self.cluster_size
+        return (
+            i * size,
+            min((i + 1) * size, self.row),
+            j * size,
+            min((j + 1) * size, self.col),
+        )
+
+    def free(self, cell):
+        return self.in_bounds(*cell) and self.stamp[self.node_id(cell)] != BLOCKED
+
+    # the borders a cluster shares with the one below and the one to the right
+    def forward_borders(self, cluster):
+        i, j = cluster
+        borders = []
+        if i + 1 < self.cluster_rows:
+            borders.append((cluster, (i + 1, j)))
+        if j + 1 < self.cluster_cols:
+            borders.append((cluster, (i, j + 1)))
+        return borders
+
+    def build(self):
+        self.borders = {}
+        for cluster in self.clusters():
+            for border in self.forward_borders(cluster):
+                self.borders[border] = self.compute_border(*border)
+
+        self.cluster_edges = {}
+        for cluster in self.clusters():
+            self.cluster_edges[cluster] = self.compute_cluster(cluster)
+        self.recomputed = set(self.clusters())
+
+    # entrances across the border between a cluster and the one below or to its right,
+    # one per run of cells that are free on both sides (two for wide runs)
+    def compute_border(self, cluster, neighbor):
+        r0, r1, c0, c1 = self.bounds(cluster)
+        if neighbor[0] > cluster[0]:
+            pairs = [((r1 - 1, c), (r1, c)) for c in range(c0, c1)]
+        else:
+            pairs = [((r, c1 - 1), (r, c1)) for r in range(r0, r1)]
+
+        entrances = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and self.free(pair[0]) and self.free(pair[1]):
+                run.append(pair)
+                continue
+            if len(run) >= ENTRANCE_SPLIT:
+                entrances += [run[0], run[-1]]
+            elif run:
+                entrances.append(run[len(run) // 2])
+            run = []
+        return entrances
+
+    def entrances(self, cluster):
+        cells = set()
+        for (a, b), pairs in self.borders.items():
+            if a == cluster:
+                cells.update(pair[0] for pair in pairs)
+            elif b == cluster:
+                cells.update(pair[1] for pair in pairs)
+        return sorted(cells)
+
+    # distances between every pair of entrances, moving only inside the cluster
+    def compute_cluster(self, cluster):
+        entrances = self.entrances(cluster)
+        edges = {}
+        for entrance in entrances:
+            distances, _ = self.local_search(entrance, self.bounds(cluster))
+            edges[entrance] = [
+                (other, distances[other])
+                for other in entrances
+                if other != entrance and other in distances
+            ]
+        return edges
+
+    # breadth first search from source without leaving bounds, returns distances and parents
+    def local_search(self, source, bounds, target=None):
+        r0, r1, c0, c1 = bounds
+        stamp = self.stamp
+        width = self.width
+        distances = {source: 0}
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            if cell == target:
+                break
+            r, c = cell
+            distance = distances[cell] + 1
+            node = (r + 1) * width + c + 1
+            for neighbor, neighbor_node, inside in (
+                ((r, c + 1), node + 1, c + 1 < c1),
+                ((r + 1, c), node + width, r + 1 < r1),
+                ((r, c - 1), node - 1, c > c0),
+                ((r - 1, c), node - width, r > r0),
+            ):
+                if (
+                    inside
+                    and stamp[neighbor_node] != BLOCKED
+                    and neighbor not in distances
+                ):
+                    distances[neighbor] = distance
+                    parents[neighbor] = cell
+                    queue.append(neighbor)
+        return distances, parents
+
+    # cells that became obstacles or free, recomputing only the clusters around them
+    def update_obstacles(self, added=(), removed=()):
+        changed = []
+        for cell in added:
+            cell = tuple(cell)
+            if self.in_bounds(*cell) and cell not in self.obstacles:
+                self.obstacles.add(cell)
+                self.stamp[self.node_id(cell)] = BLOCKED
+                changed.append(cell)
+        for cell in removed:
+            cell = tuple(cell)
+            if self.in_bounds(*cell) and cell in self.obstacles:
+                self.obstacles.remove(cell)
+                self.stamp[self.node_id(cell)] = 0
+                changed.append(cell)
+
+        # a cell on the edge of its cluster can open or close entrances on that border,
+        # which changes the entrances of the cluster on the other side too
+        touched = set()
+        for cell in changed:
+            cluster = self.cluster_of(cell)
+            touched.add(cluster)
+            for border in self.borders_at(cell):
+                self.borders[border] = self.compute_border(*border)
+                touched.update(border)
+
+        for cluster in touched:
+            self.cluster_edges[cluster] = self.compute_cluster(cluster)
+        self.recomputed = touched
+
+    # borders the cell lies on, at most two (a corner of its cluster)
+    def borders_at(self, cell):
+        cluster = self.cluster_of(cell)
+        i, j = cluster
+        r0, r1, c0, c1 = self.bounds(cluster)
+        r, c = cell
+        borders = []
+        if r == r1 - 1:
+            borders.append((cluster, (i + 1, j)))
+        if c == c1 - 1:
+            borders.append((cluster, (i, j + 1)))
+        if r == r0:
+            borders.append(((i - 1, j), cluster))
+        if c == c0:
+            borders.append(((i, j - 1), cluster))
+        return [border for border in borders if border in self.borders]
+
+    # abstract graph edges leaving an entrance: inside its cluster, and across borders
+    def abstract_neighbors(self, cell):
+        cluster = self.cluster_of(cell)
+        neighbors = list(self.cluster_edges[cluster].get(cell, []))
+        i, j = cluster
+        for border in (
+            (cluster, (i + 1, j)),
+            (cluster, (i, j + 1)),
+            ((i - 1, j), cluster),
+            ((i, j - 1), cluster),
+        ):
+            for a, b in self.borders.get(border, []):
+                if a == cell:
+                    neighbors.append((b, 1))
+                elif b == cell:
+                    neighbors.append((a, 1))
+        return neighbors
+
+    def find_path(self, start=None, dest=None):
+        start = tuple(start or self.start)
+        dest = tuple(dest or self.dest)
+        self.path = []
+        if not (self.free(start) and self.free(dest)):
+            return []
+
+        # start and dest join the abstract graph through the entrances they can reach in their cluster
+        start_cluster, dest_cluster = self.cluster_of(start), self.cluster_of(dest)
+        start_distances, _ = self.local_search(start, self.bounds(start_cluster))
+        dest_distances, _ = self.local_search(dest, self.bounds(dest_cluster))
+        start_edges = [
+            (cell, start_distances[cell])
+            for cell in self.entrances(start_cluster)
+            if cell in start_distances
+        ]
+        if dest in start_distances:
+            start_edges.append((dest, start_distances[dest]))
+        dest_entrances = {
+            cell: dest_distances[cell]
+            for cell in self.entrances(dest_cluster)
+            if cell in dest_distances
+        }
+
+        def heuristic(cell):
+            return abs(cell[0] - dest[0]) + abs(cell[1] - dest[1])
+
+        g_score = {start: 0}
+        came_from = {start: None}
+        open_heap = [(heuristic(start), start)]
+        closed = set()
+        while open_heap:
+            curr = heapq.heappop(open_heap)[1]
+            if curr in closed:
+                continue
+            closed.add(curr)
+            if curr == dest:
+                break
+
+            edges = self.abstract_neighbors(curr)
+            if curr == start:
+                edges = edges + start_edges
+            if curr in dest_entrances:
+                edges = edges + [(dest, dest_entrances[curr])]
+            for neighbor, cost in edges:
+                new_g = g_score[curr] + cost
+                if neighbor not in g_score or new_g < g_score[neighbor]:
+                    g_score[neighbor] = new_g
+                    came_from[neighbor] = curr
+                    heapq.heappush(open_heap, (new_g + heuristic(neighbor), neighbor))
+
+        if dest not in came_from:
+            return []
+
+        abstract_path = [dest]
+        while came_from[abstract_path[-1]] is not None:
+            abstract_path.append(came_from[abstract_path[-1]])
+        abstract_path.reverse()
+
+        self.path = self.refine(abstract_path)
+        return self.path
+
+    # every cell along an abstract path: local searches inside clusters, single steps across borders
+    def refine(self, abstract_path):
+        path = abstract_path[:1]
+        for a, b in zip(abstract_path, abstract_path[1:]):
+            if self.cluster_of(a) != self.cluster_of(b):
+                path.append(b)
+                continue
+
+            _, parents = self.local_search(a, self.bounds(self.cluster_of(a)), target=b)
+            segment = [b]
+            while parents[segment[-1]] != a:
+                segment.append(parents[segment[-1]])
+            path += reversed(segment)
+        return path
+
+    # fingerprint of the grid the abstract graph was built for
+    def grid_hash(self):
+        content = json.dumps(
+            [self.row, self.col, self.cluster_size, sorted(self.obstacles)]
+        )
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def to_dict(self):
+        return {
+            "cluster_size": self.cluster_size,
+            "grid_hash": self.grid_hash(),
+            "borders": [
+                [
+                    list(a),
+                    list(b),
+                    [list(cell_a) + list(cell_b) for cell_a, cell_b in pairs],
+                ]
+                for (a, b), pairs in self.borders.items()
+            ],
+            "clusters": [
+                [
+                    list(cluster),
+                    [
+                        list(a) + list(b) + [cost]
+                        for a, edges in entrances.items()
+                        for b, cost in edges
+                    ],
+                ]
+                for cluster, entrances in self.cluster_edges.items()
+            ],
+        }
+
+    # an abstract graph saved with a map, rebuilt if the map changed since it was saved
+    @classmethod
+    def from_dict(cls, data, row, col, obstacles):
+        planner = cls(
+            row, col, obstacles, cluster_size=data["cluster_size"], build=False
+        )
+        if data.get("grid_hash") != planner.grid_hash():
+            planner.build()
+            return planner
+
+        for a, b, pairs in data["borders"]:
+            planner.borders[(tuple(a), tuple(b))] = [
+                ((r_a, c_a), (r_b, c_b)) for r_a, c_a, r_b, c_b in pairs
+            ]
+        for cluster, edges in data["clusters"]:
+            entrances = {cell: [] for cell in planner.entrances(tuple(cluster))}
+            for r_a, c_a, r_b, c_b, cost in edges:
+                entrances[(r_a, c_a)].append(((r_b, c_b), cost))
+            planner.cluster_edges[tuple(cluster)] = entrances
+        return planner
@@ -0,0 +1,216 @@
+import json
+import mmap
+import struct
+import sys
+
+# Binary map format (.pfmap), little endian:
+#
+#   header    magic, version, grid width and height in cells, start and target cells
+#             ((-1, -1) if unset), map dimensions in pixels, and the offset and length
+#             of the occupancy bitmap and of the planner index
+#   bitmap    one bit per cell, 1 = obstacle, row by row (y), each row padded to whole
+#             bytes, most significant bit first (x = 0), the layout of numpy.packbits(axis=1)
+#   index     optional UTF-8 JSON of a precomputed planner graph (HPAstar.to_dict)
+#
+# The bitmap is read straight from a memory map, so opening a map doesn't depend on
+# its size, and a 1000x1000 map takes 125 KB instead of several MB of JSON pairs.
+MAGIC = b"PFMAP\0"
+VERSION = 1
+HEADER = struct.Struct("<6sHIIiiiiIIQQQQ")
+CELL_SIZE = 50  # pixels per cell, as in MapUI
+
+
+def row_bytes(width):
+    return (width + 7) // 8
+
+
+def pack_obstacles(width, height, obstacles):
+    stride = row_bytes(width)
+    bitmap = bytearray(stride * height)
+    for x, y in obstacles:
+        if 0 <= x < width and 0 <= y < height:
+            bitmap[y * stride + x // 8] |= 0x80 >> (x % 8)
+    return bitmap
+
+
+# bytes of 0 (free) and 1 (obstacle), one per cell row by row, to the bitmap: each row
+# is spelled out as a string of binary digits and converted in one go
+BINARY_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def pack_grid(width, height, grid):
+    stride = row_bytes(width)
+    padding = stride * 8 - width
+    bitmap = bytearray()
+    for y in range(height):
+        digits = bytes(grid[y * width : (y + 1) * width]).translate(BINARY_DIGITS)
+        bitmap += (int(digits or b"0", 2) << padding).to_bytes(stride, "big")
+    return bitmap
+
+
+# bitmap, if given, is the packed grid and obstacles are ignored
+def save_map_file(
+    path,
+    width,
+    height,
+    obstacles,
+    start=None,
+    target=None,
+    dimensions=None,
+    index=None,
+    bitmap=None,
+):
+    start = start or (-1, -1)
+    target = target or (-1, -1)
+    dimensions = dimensions or {
+        "width": width * CELL_SIZE,
+        "height": height * CELL_SIZE,
+    }
+
+    if bitmap is None:
+        bitmap = pack_obstacles(width, height, obstacles)
+    index_data = json.dumps(index).encode() if index is not None else b""
+    bitmap_offset = HEADER.size
+    index_offset = bitmap_offset + len(bitmap)
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        width,
+        height,
+        start[0],
+        start[1],
+        target[0],
+        target[1],
+        dimensions["width"],
+        dimensions["height"],
+        bitmap_offset,
+        len(bitmap),
+        index_offset,
+        len(index_data),
+    )
+    with open(path, "wb") as file:
+        file.write(header)
+        file.write(bitmap)
+        file.write(index_data)
+
+
+class MapFile:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a map file")
+        (
+            magic,
+            version,
+            self.width,
+            self.height,
+            start_x,
+            start_y,
+            target_x,
+            target_y,
+            pixel_width,
+            pixel_height,
+            self.bitmap_offset,
+            self.bitmap_length,
+            self.index_offset,
+            self.index_length,
+        ) = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a map file")
+        if version != VERSION:
+            self.close()
+            raise ValueError(
+                f"{path} is map format version {version}, expected {VERSION}"
+            )
+
+        self.start = (start_x, start_y) if start_x >= 0 else None
+        self.target = (target_x, target_y) if target_x >= 0 else None
+        self.dimensions = {"width": pixel_width, "height": pixel_height}
+        self.stride = row_bytes(self.width)
+
+    def is_obstacle(self, x, y):
+        byte = self.data[self.bitmap_offset + y * self.stride + x // 8]
+        return bool(byte & (0x80 >> (x % 8)))
+
+    # (x, y) of every obstacle, in time proportional to the number of obstacles rather than cells
+    def obstacles(self):
+        cells = set()
+        for y in range(self.height):
+            offset = self.bitmap_offset + y * self.stride
+            bits = int.from_bytes(self.data[offset : offset + self.stride], "big")
+            last = self.stride * 8 - 1
+            while bits:
+                low = bits & -bits
+                cells.add((last - low.bit_length() + 1, y))
+                bits ^= low
+        return cells
+
+    # the precomputed planner graph saved with the map, None if there isn't one
+    def index(self):
+        if not self.index_length:
+            return None
+        return json.loads(
+            self.data[self.index_offset : self.index_offset + self.index_length]
+        )
+
+    # the same fields MapUI.save_map writes to JSON
+    def to_dict(self):
+        map_data = {
+            "start": list(self.start) if self.start else None,
+            "target": list(self.target) if self.target else None,
+            "obstacles": sorted([x, y] for x, y in self.obstacles()),
+            "dimensions": self.dimensions,
+        }
+        index = self.index()
+        if index is not None:
+            map_data["hierarchy"] = index
+        return map_data
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def json_to_map_file(json_path, path, cell_size=CELL_SIZE):
+    with open(json_path, "r") as file:
+        map_data = json.load(file)
+    width = map_data["dimensions"]["width"] // cell_size
+    height = map_data["dimensions"]["height"] // cell_size
+    save_map_file(
+        path,
+        width,
+        height,
+        [tuple(obstacle) for obstacle in map_data["obstacles"]],
+        map_data.get("start"),
+        map_data.get("target"),
+        map_data["dimensions"],
+        map_data.get("hierarchy"),
+    )
+
+
+def map_file_to_json(path, json_path):
+    with MapFile(path) as map_file:
+        map_data = map_file.to_dict()
+    with open(json_path, "w") as file:
+        json.dump(map_data, file)
+
+
+# python MapFile.py map.json map.pfmap, or the other way around
+if __name__ == "__main__":
+    source, destination = sys.argv[1], sys.argv[2]
+    if source.endswith(".json"):
+        json_to_map_file(source, destination)
+    else:
+        map_file_to_json(source, destination)
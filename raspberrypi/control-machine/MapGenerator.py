@@ -0,0 +1,228 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import random
+import time
+from MapFile import save_map_file, pack_grid, CELL_SIZE
+
+# Map generation without the Tk UI: every generator fills a grid, a bytearray of
+# width * height cells indexed [y * width + x], FREE or WALL. Pass a seeded
+# random.Random as rng to get the same map every time.
+FREE = 0
+WALL = 1
+KINDS = ("maze", "random", "rooms")
+
+
+def obstacles(grid, width):
+    return {(i % width, i // width) for i, cell in enumerate(grid) if cell == WALL}
+
+
+# recursive backtracker, as MapUI.build_maze: passages two cells apart carved out of
+# a grid full of walls starting from start, then a few random walls knocked out so
+# there is more than one way around
+def maze(width, height, start=(0, 0), rng=random, additional_paths=3):
+    # carved in a copy of the grid with a border two cells wide that is never a wall,
+    # so finding the neighbors still to visit needs no bounds checks
+    padded_width = width + 4
+    work = bytearray(padded_width * (height + 4))
+    for y in range(height):
+        row = (y + 2) * padded_width + 2
+        work[row : row + width] = bytes([WALL]) * width
+
+    # cells as flat indices, neighbors two cells away in the order down, right, up, left
+    steps = (2 * padded_width, 2, -2 * padded_width, -2)
+    start_x, start_y = start
+    first = (start_y + 2) * padded_width + start_x + 2
+    work[first] = FREE
+    stack = [first]
+    while stack:
+        i = stack[-1]
+        nbrs = [i + step for step in steps if work[i + step] == WALL]
+        if nbrs:
+            j = rng.choice(nbrs)
+            work[(i + j) // 2] = FREE
+            work[j] = FREE
+            stack.append(j)
+        else:
+            stack.pop()
+
+    grid = bytearray()
+    for y in range(height):
+        row = (y + 2) * padded_width + 2
+        grid += work[row : row + width]
+
+    for _ in range(additional_paths):
+        x, y = rng.randint(0, width - 1), rng.randint(0, height - 1)
+        grid[y * width + x] = FREE
+
+    return grid
+
+
+# every cell is a wall with probability density
+def random_obstacles(width, height, density=0.3, rng=random):
+    return bytearray(
+        WALL if rng.random() < density else FREE for _ in range(width * height)
+    )
+
+
+# rectangular rooms that don't touch each other, each joined to the one before
+# by an L-shaped corridor, returns the grid and the rooms as (x, y, width, height)
+def rooms_and_corridors(
+    width, height, rng=random, room_count=8, min_room=3, max_room=8
+):
+    grid = bytearray([WALL]) * (width * height)
+    rooms = []
+    for _ in range(room_count * 10):
+        if len(rooms) == room_count:
+            break
+        room_width = rng.randint(min_room, max(min_room, min(max_room, width - 2)))
+        room_height = rng.randint(min_room, max(min_room, min(max_room, height - 2)))
+        if room_width > width - 2 or room_height > height - 2:
+            break
+        x = rng.randint(1, width - room_width - 1)
+        y = rng.randint(1, height - room_height - 1)
+        if any(
+            x <= other_x + other_width
+            and other_x <= x + room_width
+            and y <= other_y + other_height
+            and other_y <= y + room_height
+            for other_x, other_y, other_width, other_height in rooms
+        ):
+            continue
+        for row in range(y, y + room_height):
+            grid[row * width + x : row * width + x + room_width] = bytes(room_width)
+        rooms.append((x, y, room_width, room_height))
+
+    centers = [room_center(room) for room in rooms]
+    for (x1, y1), (x2, y2) in zip(centers, centers[1:]):
+        # horizontal then vertical, or the other way around
+        corner = (x2, y1) if rng.random() < 0.5 else (x1, y2)
+        for (ax, ay), (bx, by) in (((x1, y1), corner), (corner, (x2, y2))):
+            for x in range(min(ax, bx), max(ax, bx) + 1):
+                for y in range(min(ay, by), max(ay, by) + 1):
+                    grid[y * width + x] = FREE
+
+    return grid, rooms
+
+
+def room_center(room):
+    x, y, room_width, room_height = room
+    return (x + room_width // 2, y + room_height // 2)
+
+
+# a map of the given kind with its start and target, both free cells:
+# opposite corners for mazes and random fields, the first and last room otherwise
+def generate_map(kind, width, height, seed=None, density=0.3, room_count=8):
+    rng = random.Random(seed)
+    if kind == "maze":
+        grid = maze(width, height, (0, 0), rng)
+        start = (0, 0)
+        target = (width - 1 - (width - 1) % 2, height - 1 - (height - 1) % 2)
+    elif kind == "random":
+        grid = random_obstacles(width, height, density, rng)
+        start, target = (0, 0), (width - 1, height - 1)
+    elif kind == "rooms":
+        grid, rooms = rooms_and_corridors(width, height, rng, room_count)
+        if not rooms:
+            raise ValueError(f"a {width}x{height} grid is too small for rooms")
+        start, target = room_center(rooms[0]), room_center(rooms[-1])
+    else:
+        raise ValueError(f"unknown map kind {kind!r}, expected one of {KINDS}")
+
+    for x, y in (start, target):
+        grid[y * width + x] = FREE
+    return grid, start, target
+
+
+def save_generated(path, width, height, grid, start, target):
+    if path.endswith(".pfmap"):
+        save_map_file(
+            path,
+            width,
+            height,
+            (),
+            start,
+            target,
+            bitmap=pack_grid(width, height, grid),
+        )
+        return
+
+    # same fields as MapUI.save_map
+    map_data = {
+        "start": start,
+        "target": target,
+        "obstacles": sorted(obstacles(grid, width)),
+        "dimensions": {"width": width * CELL_SIZE, "height": height * CELL_SIZE},
+    }
+    with open(path, "w") as file:
+        json.dump(map_data, file)
+
+
+# one map of a batch, every seed is independent so batches can be spread over processes
+def generate_and_save(
+    seed, kind, width, height, density, room_count, output_dir, format
+):
+    grid, start, target = generate_map(kind, width, height, seed, density, room_count)
+    name = f"{kind}_{width}x{height}_{seed:06d}.{format}"
+    save_generated(os.path.join(output_dir, name), width, height, grid, start, target)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate maps for planner benchmarks and regression tests"
+    )
+    parser.add_argument("--kind", choices=KINDS, default="maze")
+    parser.add_argument(
+        "--size", type=int, nargs=2, default=(50, 50), metavar=("WIDTH", "HEIGHT")
+    )
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed of the first map, the next ones count up from it",
+    )
+    parser.add_argument(
+        "--density", type=float, default=0.3, help="share of wall cells for random maps"
+    )
+    parser.add_argument(
+        "--rooms", type=int, default=8, help="number of rooms for rooms maps"
+    )
+    parser.add_argument("--format", choices=("pfmap", "json"), default="pfmap")
+    parser.add_argument("--output-dir", default="maps")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes to spread the seeds over, one makes a few hundred 50x50 maps/s "
+        "so thousands per second take several",
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    width, height = args.size
+    seeds = range(args.seed, args.seed + args.count)
+    generate = functools.partial(
+        generate_and_save,
+        kind=args.kind,
+        width=width,
+        height=height,
+        density=args.density,
+        room_count=args.rooms,
+        output_dir=args.output_dir,
+        format=args.format,
+    )
+    started = time.perf_counter()
+    if args.workers > 1:
+        with multiprocessing.Pool(args.workers) as pool:
+            chunksize = max(1, args.count // (args.workers * 8))
+            for _ in pool.imap_unordered(generate, seeds, chunksize):
+                pass
+    else:
+        for seed in seeds:
+            generate(seed)
+
+    elapsed = time.perf_counter() - started
+    print(f"{args.count} maps in {args.output_dir} ({args.count / elapsed:.0f} maps/s)")
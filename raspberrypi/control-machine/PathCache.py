@@ -0,0 +1,119 @@
+import hashlib
+import random
+from collections import OrderedDict
+from Astar import Astar, path_directions
+
+CACHE_CAPACITY = 256
+
+
+# 64 bit fingerprint of a cell, a map's hash is the XOR of its obstacles' fingerprints
+# so adding or removing an obstacle updates it in O(1) and the order doesn't matter
+def cell_hash(cell):
+    r, c = cell
+    return int.from_bytes(
+        hashlib.blake2b(f"{r},{c}".encode(), digest_size=8).digest(), "big"
+    )
+
+
+def map_hash(row, col, obstacles):
+    value = cell_hash((row, col))  # the grid size, never an obstacle cell itself
+    for cell in obstacles:
+        value ^= cell_hash(cell)
+    return value
+
+
+def toggle_obstacle(value, cell):
+    return value ^ cell_hash(cell)
+
+
+# Least recently used cache of planned routes, keyed by (map hash, start, goal, start heading, planner)
+# each route keeps the bounding box of the cells it could have gone through, so an edit
+# to the map only drops the routes it could have changed and carries the rest over.
+# The directions are worked out here from the key's heading, never taken from the
+# planner, so a key always maps to the same commands whatever was planned before it
+class PathCache:
+    def __init__(self, capacity=CACHE_CAPACITY):
+        self.capacity = capacity
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, map_hash, start, dest, heading, planner="astar"):
+        key = (map_hash, tuple(start), tuple(dest), heading, planner)
+        if key not in self.routes:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.routes.move_to_end(key)
+        path, directions, _ = self.routes[key]
+        return list(path), list(directions)
+
+    # caches path and returns its directions from heading
+    def put(self, map_hash, start, dest, heading, path, planner="astar"):
+        key = (map_hash, tuple(start), tuple(dest), heading, planner)
+        directions = path_directions(path, heading)[0] if path else []
+        self.routes[key] = (
+            tuple(path),
+            tuple(directions),
+            self.affected_area(start, dest, path),
+        )
+        self.routes.move_to_end(key)
+        while len(self.routes) > self.capacity:
+            self.routes.popitem(last=False)
+        return directions
+
+    # any route through a cell outside this box is at least as long as the cached one, so
+    # obstacles added or removed outside it can't change the route: the box around start
+    # and dest, grown by half the detour the route already takes (the whole grid if there is no route)
+    def affected_area(self, start, dest, path):
+        if not path:
+            return None
+        detour = len(path) - 1 - (abs(start[0] - dest[0]) + abs(start[1] - dest[1]))
+        margin = detour // 2
+        return (
+            min(start[0], dest[0]) - margin,
+            max(start[0], dest[0]) + margin,
+            min(start[1], dest[1]) - margin,
+            max(start[1], dest[1]) + margin,
+        )
+
+    # the map went from old_hash to new_hash by toggling the changed cells
+    def update_map(self, old_hash, new_hash, changed_cells):
+        for key in [key for key in self.routes if key[0] == old_hash]:
+            path, directions, area = self.routes.pop(key)
+            if area is None or any(
+                area[0] <= r <= area[1] and area[2] <= c <= area[3]
+                for r, c in changed_cells
+            ):
+                continue
+            self.routes[(new_hash,) + key[1:]] = (path, directions, area)
+
+    def clear(self):
+        self.routes.clear()
+
+
+# python3 PathCache.py: queries in a row on a cache shared between them must give the
+# same path and directions as a fresh Astar for each query
+if __name__ == "__main__":
+    rng = random.Random(0)
+    size = 20
+    obstacles = {(rng.randrange(size), rng.randrange(size)) for _ in range(80)}
+    value = map_hash(size, size, obstacles)
+    cache = PathCache()
+    free = [(x, y) for x in range(size) for y in range(size) if (x, y) not in obstacles]
+    # repeated, so some come from the cache
+    queries = [rng.sample(free, 2) for _ in range(50)]
+    mismatches = 0
+    for _ in range(500):
+        start, dest = rng.choice(queries)
+        planner = Astar(size, size, obstacles, start, dest)
+        expected = planner.find_path()
+        expected_directions = planner.find_directions() if expected else []
+
+        cached = cache.get(value, start, dest, "N")
+        if cached is None:
+            cached = expected, cache.put(value, start, dest, "N", expected)
+        mismatches += cached != (expected, expected_directions)
+    print(
+        f"{mismatches} of 500 queries ({cache.hits} cached) differ from a fresh Astar"
+    )
@@ -0,0 +1,147 @@
+import heapq
+from Astar import *
+
+# Time the robot takes for each command, from the calibration in board/conf.py:
+# "F" drives one block (BLOCK_SIZE * SERVO_FACTOR), "L"/"R" turn 90 degrees (90 / TURNING_FACTOR)
+BLOCK_SIZE = 0.25
+SERVO_FACTOR = 7.5
+TURNING_FACTOR = 90 / 1.3
+FORWARD_TIME = BLOCK_SIZE * SERVO_FACTOR
+TURN_TIME = 90 / TURNING_FACTOR
+
+# headings in right turn order, and the cell each one faces, as in find_directions
+HEADINGS = ["N", "E", "S", "W"]
+HEADING_STEPS = {"N": (0, -1), "E": (1, 0), "S": (0, 1), "W": (-1, 0)}
+
+
+# A* over (cell, heading) states instead of cells: driving forward a block and turning
+# in place are separate moves with their own cost in seconds, so the path returned is
+# the one that takes the least time to drive, starting from self.orientation. Paths
+# with fewer turns win over zig-zags of the same length.
+# find_directions turns the path into the same L/R/F commands the search costed.
+class TurnAwareAstar(Astar):
+    def __init__(
+        self,
+        row,
+        col,
+        obstacles,
+        start,
+        dest,
+        forward_time=FORWARD_TIME,
+        turn_time=TURN_TIME,
+    ):
+        super().__init__(row, col, obstacles, start, dest)
+        self.forward_time = forward_time
+        self.turn_time = turn_time
+        self.time = None  # seconds to drive the last path found
+
+        size = len(self.stamp) * len(HEADINGS)
+        self.g_score = [0] * size
+        self.came_from = [-1] * size
+        self.state_stamp = [0] * size
+
+    # lower bound on the time from a cell and heading to the destination: every block
+    # still to go, and the turns needed to face each direction we still have to go in
+    def heuristic(self, node, heading):
+        r, c = divmod(node, self.width)
+        dest_r, dest_c = divmod(self.node_id(self.dest), self.width)
+        delta_r, delta_c = dest_r - r, dest_c - c
+
+        needed = set()
+        if delta_r:
+            needed.add("E" if delta_r > 0 else "W")
+        if delta_c:
+            needed.add("S" if delta_c > 0 else "N")
+
+        name = HEADINGS[heading]
+        if not needed:
+            turns = 0
+        elif name in needed:
+            turns = len(needed) - 1
+        elif len(needed) == 1 and HEADINGS[(heading + 2) % 4] in needed:
+            turns = 2
+        else:
+            turns = len(needed)
+        return (
+            abs(delta_r) + abs(delta_c)
+        ) * self.forward_time + turns * self.turn_time
+
+    def find_path(self):
+        self.clear()
+        self.time = None
+        if not (self.in_bounds(*self.start) and self.in_bounds(*self.dest)):
+            return []
+
+        stamp = self.stamp
+        state_stamp = self.state_stamp
+        g_score = self.g_score
+        came_from = self.came_from
+        seen_stamp = 2 * self.generation
+        closed_stamp = seen_stamp + 1
+        dest = self.node_id(self.dest)
+        steps = [
+            HEADING_STEPS[name][0] * self.width + HEADING_STEPS[name][1]
+            for name in HEADINGS
+        ]
+
+        start = self.node_id(self.start) * 4 + HEADINGS.index(self.orientation)
+        g_score[start] = 0
+        came_from[start] = -1
+        state_stamp[start] = seen_stamp
+        self.open = [(self.heuristic(start // 4, start % 4), start)]
+
+        while self.open:
+            curr = heapq.heappop(self.open)[1]
+            if state_stamp[curr] == closed_stamp:
+                continue
+            state_stamp[curr] = closed_stamp
+
+            node, heading = divmod(curr, 4)
+            if node == dest:
+                self.time = g_score[curr]
+                self.path = self.reconstruct_states(curr)
+                return self.path
+
+            # forward one block, or a quarter turn either way
+            moves = [
+                ((heading + 1) % 4, node, self.turn_time),
+                ((heading - 1) % 4, node, self.turn_time),
+            ]
+            if stamp[node + steps[heading]] != BLOCKED:
+                moves.append((heading, node + steps[heading], self.forward_time))
+
+            for next_heading, next_node, cost in moves:
+                state = next_node * 4 + next_heading
+                if state_stamp[state] == closed_stamp:
+                    continue
+                new_g = g_score[curr] + cost
+                if state_stamp[state] != seen_stamp or g_score[state] > new_g:
+                    state_stamp[state] = seen_stamp
+                    g_score[state] = new_g
+                    came_from[state] = curr
+                    f_score = new_g + self.heuristic(next_node, next_heading)
+                    heapq.heappush(self.open, (f_score, state))
+
+        return []
+
+    # cells along the states leading to state, turns in place don't add a cell
+    def reconstruct_states(self, state):
+        states = []
+        while state != -1:
+            states.append(state)
+            state = self.came_from[state]
+        states.reverse()
+
+        path = []
+        for state in states:
+            cell = self.cell(state // 4)
+            if not path or path[-1] != cell:
+                path.append(cell)
+        return path
+
+    # seconds to drive a list of find_directions commands
+    def directions_time(self, directions):
+        return sum(
+            self.forward_time if direction == "F" else self.turn_time
+            for direction in directions
+        )
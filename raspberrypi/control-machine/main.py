@@ -3,6 +3,10 @@ import tkinter as tk
 from tkinter import messagebox, filedialog
 import json
 from Astar import *
+from HPAstar import *
+from PathCache import *
+from MapFile import *
+from MapGenerator import maze, WALL
 import random
 
 
@@ -14,15 +18,28 @@ class CellType(Enum):
     VISITED_PATH = "P"
 
 
+CELL_COLORS = {
+    CellType.START: "green",
+    CellType.END: "red",
+    CellType.WALL: "black",
+    CellType.VISITED_PATH: "blue",
+    CellType.PATH: "white",
+}
+
+
 class MapUI:
     def __init__(self, root, width, height):
         self.root = root
         self.root.title("Particle Filter Map Builder")
 
-        self.cell_size = 50
+        self.cell_size = CELL_SIZE
         self.grid_width = width // self.cell_size
         self.grid_height = height // self.cell_size
 
+        # loaded maps bigger than the window get smaller cells so they still fit in it
+        self.view_width = self.grid_width * self.cell_size
+        self.view_height = self.grid_height * self.cell_size
+
         self.canvas = tk.Canvas(
             self.root,
             width=self.grid_width * self.cell_size,
@@ -44,10 +61,28 @@ class MapUI:
         self.height = height
 
         self.pathfinder = None
+        self.route = None  # path and directions of the last path found
+
+        # repeated path queries on an unchanged part of the map come from the cache
+        self.path_cache = PathCache()
+        self.map_hash = map_hash(self.grid_height, self.grid_width, self.obstacles)
+
+        # abstract graph for hierarchical planning, kept up to date as the map is edited and saved with it,
+        # find_path only uses it when "Use HPA*" is ticked: faster on big loaded maps, but paths are near-optimal
+        self.hierarchy = HPAstar(self.grid_height, self.grid_width, self.obstacles)
+        self.use_hierarchy = tk.BooleanVar(value=False)
+
+        # one canvas item per cell, created once and recolored in batches:
+        # draw_cell only records the cell, redraw applies everything recorded since the last one
+        self.cell_items = []
+        self.cell_colors = []
+        self.dirty_cells = {}
+        self.redraw_scheduled = False
+
         self.canvas.bind("<Button-1>", self.add_point)
 
         self.create_buttons()
-        self.draw_grid()
+        self.create_cells()
 
     def create_buttons(self):
 
@@ -101,6 +136,11 @@ class MapUI:
         )
         self.maze_button.grid(row=1, column=2)
 
+        self.hierarchy_button = tk.Checkbutton(
+            self.button_frame, text="Use HPA*", variable=self.use_hierarchy
+        )
+        self.hierarchy_button.grid(row=1, column=3)
+
     def set_start_position(self):
         self.mode = "start"
         self.root.title("Particle Filter Map Builder [Mode: Set Start Position]")
@@ -114,7 +154,6 @@ class MapUI:
         self.root.title("Particle Filter Map Builder [Mode: Add Obstacles]")
 
     def clear(self):
-        self.canvas.delete("all")
         self.grid = [
             [CellType.PATH for _ in range(self.grid_width)]
             for _ in range(self.grid_height)
@@ -122,29 +161,79 @@ class MapUI:
         self.start_pos = None
         self.target_pos = None
         self.obstacles = set()
+        self.hierarchy = HPAstar(self.grid_height, self.grid_width, self.obstacles)
+        self.map_hash = map_hash(self.grid_height, self.grid_width, self.obstacles)
+        self.route = None
         self.mode = None
         self.draw_grid()
         self.root.title("Particle Filter Map Builder")
 
+    # switch to a map of another size: a new empty grid and a new set of cell items
+    def resize_grid(self, grid_width, grid_height, dimensions):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.width = dimensions["width"]
+        self.height = dimensions["height"]
+        self.cell_size = max(
+            1,
+            min(
+                CELL_SIZE,
+                self.view_width // grid_width,
+                self.view_height // grid_height,
+            ),
+        )
+
+        self.canvas.delete("all")
+        self.canvas.config(
+            width=self.grid_width * self.cell_size,
+            height=self.grid_height * self.cell_size,
+        )
+        self.grid = [
+            [CellType.PATH for _ in range(self.grid_width)]
+            for _ in range(self.grid_height)
+        ]
+        self.dirty_cells = {}
+        self.create_cells()
+
+    def create_cells(self):
+        self.cell_items = []
+        self.cell_colors = []
+        # tiny cells would be all outline
+        outline = "black" if self.cell_size >= 5 else ""
+        for y in range(self.grid_height):
+            items = []
+            for x in range(self.grid_width):
+                x1, y1 = x * self.cell_size, y * self.cell_size
+                x2, y2 = x1 + self.cell_size, y1 + self.cell_size
+                color = CELL_COLORS[self.grid[y][x]]
+                items.append(
+                    self.canvas.create_rectangle(
+                        x1, y1, x2, y2, fill=color, outline=outline
+                    )
+                )
+            self.cell_items.append(items)
+            self.cell_colors.append([CELL_COLORS[cell] for cell in self.grid[y]])
+
     def draw_grid(self):
         for y in range(self.grid_height):
             for x in range(self.grid_width):
                 self.draw_cell(x, y, self.grid[y][x])
 
     def draw_cell(self, x, y, cell_type):
-        x1, y1 = x * self.cell_size, y * self.cell_size
-        x2, y2 = x1 + self.cell_size, y1 + self.cell_size
-
-        if cell_type == CellType.START:
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill="green", outline="black")
-        elif cell_type == CellType.END:
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill="red", outline="black")
-        elif cell_type == CellType.WALL:
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill="black", outline="black")
-        elif cell_type == CellType.VISITED_PATH:
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill="blue", outline="black")
-        else:
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill="white", outline="black")
+        self.dirty_cells[(x, y)] = cell_type
+        if not self.redraw_scheduled:
+            self.redraw_scheduled = True
+            self.root.after_idle(self.redraw)
+
+    # recolor the cells drawn since the last redraw, skipping the ones already showing their color
+    def redraw(self):
+        for (x, y), cell_type in self.dirty_cells.items():
+            color = CELL_COLORS[cell_type]
+            if self.cell_colors[y][x] != color:
+                self.canvas.itemconfig(self.cell_items[y][x], fill=color)
+                self.cell_colors[y][x] = color
+        self.dirty_cells = {}
+        self.redraw_scheduled = False
 
     def add_point(self, event):
         x, y = event.x // self.cell_size, event.y // self.cell_size
@@ -167,23 +256,34 @@ class MapUI:
             if self.grid[y][x] == CellType.PATH:
                 self.grid[y][x] = CellType.WALL
                 self.obstacles.add((x, y))
+                self.hierarchy.update_obstacles(added=[(x, y)])
+                self.edit_map_hash((x, y))
             elif self.grid[y][x] == CellType.WALL:
                 self.grid[y][x] = CellType.PATH
                 self.obstacles.remove((x, y))
+                self.hierarchy.update_obstacles(removed=[(x, y)])
+                self.edit_map_hash((x, y))
 
         self.draw_cell(x, y, self.grid[y][x])
 
+    # an obstacle was toggled, cached paths it can't affect stay valid for the new map
+    def edit_map_hash(self, cell):
+        new_hash = toggle_obstacle(self.map_hash, cell)
+        self.path_cache.update_map(self.map_hash, new_hash, [cell])
+        self.map_hash = new_hash
+
     def save_path(self):
-        if not self.start_pos or not self.target_pos or not self.pathfinder:
+        if not self.start_pos or not self.target_pos or not self.route:
             messagebox.showwarning(
                 "No path found",
                 "Please set both start and target positions or find path before saving.",
             )
             return
 
+        # the path and directions worked out by find_path, directions are always from the initial north bearing
         path_data = {
-            "directions": self.pathfinder.find_directions(),
-            "path_coords": self.pathfinder.find_path(),
+            "directions": self.route["directions"],
+            "path_coords": self.route["path_coords"],
         }
 
         file_path = filedialog.asksaveasfilename(
@@ -210,15 +310,32 @@ class MapUI:
             "target": self.target_pos,
             "obstacles": list(self.obstacles),
             "dimensions": {"width": self.width, "height": self.height},
+            "hierarchy": self.hierarchy.to_dict(),
         }
 
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".json", filetypes=[("JSON files", "*.json")]
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("Binary map files", "*.pfmap")],
         )
-        if file_path:
+        if not file_path:
+            return
+
+        # .pfmap for large maps: bit-packed occupancy, opened without parsing
+        if file_path.endswith(".pfmap"):
+            save_map_file(
+                file_path,
+                self.grid_width,
+                self.grid_height,
+                self.obstacles,
+                self.start_pos,
+                self.target_pos,
+                map_data["dimensions"],
+                map_data["hierarchy"],
+            )
+        else:
             with open(file_path, "w") as file:
                 json.dump(map_data, file)
-            messagebox.showinfo("Save Successful", f"Map saved to {file_path}")
+        messagebox.showinfo("Save Successful", f"Map saved to {file_path}")
 
     def find_path(self):
         if not self.start_pos or not self.target_pos:
@@ -231,13 +348,30 @@ class MapUI:
         start = self.start_pos
         dest = self.target_pos
 
-        self.pathfinder = Astar(
-            self.grid_height, self.grid_width, self.obstacles, start, dest
-        )
-        path = self.pathfinder.find_path()
+        planner = "hpa" if self.use_hierarchy.get() else "astar"
+        cached = self.path_cache.get(self.map_hash, start, dest, "N", planner)
+        if cached:
+            path, directions = cached
+        else:
+            if planner == "hpa":
+                # through the abstract graph kept up to date with the map,
+                # only the clusters along the way are searched cell by cell
+                self.pathfinder = self.hierarchy
+                path = self.pathfinder.find_path(start, dest)
+            else:
+                self.pathfinder = Astar(
+                    self.grid_height, self.grid_width, self.obstacles, start, dest
+                )
+                path = self.pathfinder.find_path()
+            # directions are always from the initial north bearing, whatever the planner did before
+            directions = self.path_cache.put(
+                self.map_hash, start, dest, "N", path, planner
+            )
+
+        self.route = {"directions": directions, "path_coords": path} if path else None
 
         if not path:
-            print("path not found via A*")
+            print("path not found via", "HPA*" if planner == "hpa" else "A*")
 
         for x, y in path:
             self.grid[y][x] = CellType.VISITED_PATH
@@ -245,26 +379,53 @@ class MapUI:
 
     def load_map(self):
         file_path = filedialog.askopenfilename(
-            defaultextension=".json", filetypes=[("JSON files", "*.json")]
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("Binary map files", "*.pfmap")],
         )
         if not file_path:
             return
 
-        with open(file_path, "r") as file:
-            map_data = json.load(file)
-
+        if file_path.endswith(".pfmap"):
+            with MapFile(file_path) as map_file:
+                grid_width, grid_height = map_file.width, map_file.height
+                dimensions = map_file.dimensions
+                start, target = map_file.start, map_file.target
+                obstacles = map_file.obstacles()
+                hierarchy = map_file.index()
+        else:
+            with open(file_path, "r") as file:
+                map_data = json.load(file)
+            dimensions = map_data["dimensions"]
+            grid_width = dimensions["width"] // CELL_SIZE
+            grid_height = dimensions["height"] // CELL_SIZE
+            start, target = map_data["start"], map_data["target"]
+            obstacles = set(tuple(obstacle) for obstacle in map_data["obstacles"])
+            hierarchy = map_data.get("hierarchy")
+
+        if (grid_width, grid_height) != (self.grid_width, self.grid_height):
+            self.resize_grid(grid_width, grid_height, dimensions)
         self.clear()
 
-        self.start_pos = tuple(map_data["start"])
-        self.target_pos = tuple(map_data["target"])
-        self.obstacles = set(tuple(obstacle) for obstacle in map_data["obstacles"])
+        self.start_pos = tuple(start) if start else None
+        self.target_pos = tuple(target) if target else None
+        self.obstacles = obstacles
+        if hierarchy is not None:
+            self.hierarchy = HPAstar.from_dict(
+                hierarchy, self.grid_height, self.grid_width, self.obstacles
+            )
+        else:
+            self.hierarchy = HPAstar(self.grid_height, self.grid_width, self.obstacles)
+        self.map_hash = map_hash(self.grid_height, self.grid_width, self.obstacles)
 
-        self.grid[self.start_pos[1]][self.start_pos[0]] = CellType.START
-        self.grid[self.target_pos[1]][self.target_pos[0]] = CellType.END
+        if self.start_pos:
+            self.grid[self.start_pos[1]][self.start_pos[0]] = CellType.START
+        if self.target_pos:
+            self.grid[self.target_pos[1]][self.target_pos[0]] = CellType.END
         for x, y in self.obstacles:
             self.grid[y][x] = CellType.WALL
 
         self.draw_grid()
+        self.redraw()
 
         self.root.title("Particle Filter Map Builder [Map Loaded]")
         messagebox.showinfo("Load Successful", f"Map loaded from {file_path}")
@@ -279,64 +440,23 @@ class MapUI:
             )
             return
 
-        self.obstacles = set()
-
-        def is_valid(nx, ny):
-            return (
-                0 <= nx < self.grid_width
-                and 0 <= ny < self.grid_height
-                and self.grid[ny][nx] == CellType.WALL
-            )
-
-        def neighbors(x, y):
-            dirs = [(0, 2), (2, 0), (0, -2), (-2, 0)]
-            result = []
-            for dx, dy in dirs:
-                nx, ny = x + dx, y + dy
-                if is_valid(nx, ny):
-                    result.append((nx, ny))
-            return result
-
-        def break_wall(x1, y1, x2, y2):
-            mx, my = (x1 + x2) // 2, (y1 + y2) // 2
-            self.grid[my][mx] = CellType.PATH
-            self.draw_cell(mx, my, CellType.PATH)
-
         start_x, start_y = self.start_pos
         end_x, end_y = self.target_pos
 
+        maze_grid = maze(self.grid_width, self.grid_height, self.start_pos, random)
         self.grid = [
-            [CellType.WALL for _ in range(self.grid_width)]
-            for _ in range(self.grid_height)
+            [
+                (
+                    CellType.WALL
+                    if maze_grid[y * self.grid_width + x] == WALL
+                    else CellType.PATH
+                )
+                for x in range(self.grid_width)
+            ]
+            for y in range(self.grid_height)
         ]
-
         self.grid[start_y][start_x] = CellType.START
-        self.draw_cell(start_x, start_y, CellType.START)
-
-        stack = [(start_x, start_y)]
-        while stack:
-            x, y = stack[-1]
-            nbrs = neighbors(x, y)
-            if nbrs:
-                nx, ny = random.choice(nbrs)
-                break_wall(x, y, nx, ny)
-                self.grid[ny][nx] = CellType.PATH
-                self.draw_cell(nx, ny, CellType.PATH)
-                stack.append((nx, ny))
-            else:
-                stack.pop()
-
-        additional_paths = 3
-        for _ in range(additional_paths):
-            x, y = random.randint(0, self.grid_width - 1), random.randint(
-                0, self.grid_height - 1
-            )
-            if self.grid[y][x] == CellType.WALL:
-                self.grid[y][x] = CellType.PATH
-                self.draw_cell(x, y, CellType.PATH)
-
         self.grid[end_y][end_x] = CellType.END
-        self.draw_cell(end_x, end_y, CellType.END)
 
         self.obstacles = set(
             (x, y)
@@ -344,9 +464,12 @@ class MapUI:
             for x in range(self.grid_width)
             if self.grid[y][x] == CellType.WALL
         )
+        self.hierarchy = HPAstar(self.grid_height, self.grid_width, self.obstacles)
+        self.map_hash = map_hash(self.grid_height, self.grid_width, self.obstacles)
 
-        for x, y in self.obstacles:
-            self.draw_cell(x, y, CellType.WALL)
+        # every cell may have changed, redraw them in one batch once the maze is done
+        self.draw_grid()
+        self.redraw()
 
         self.root.title("Particle Filter Map Builder [Maze Built]")
         messagebox.showinfo("Maze Built", "The maze has been successfully built.")
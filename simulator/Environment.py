@@ -1,16 +1,19 @@
 import pygame
 import math
 import sys
+import numpy as np
+from conf import *
 
+# draws the latest snapshot published by the particle filter (see Snapshot.py), never the live robot and particles,
+# so a frame always shows one complete step no matter how far the filter thread has gotten
 class Environment:
-    def __init__(self, width, height, obstacles, robot, particles):
+    def __init__(self, width, height, obstacles, snapshots):
         pygame.init()
 
         self.width = width
         self.height = height
         self.obstacles = obstacles
-        self.robot = robot
-        self.particles = particles
+        self.snapshots = snapshots
 
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("Monte Carlo Localization - Particle Filter")
@@ -28,25 +31,34 @@ class Environment:
         self.draw_robot_measurements = False
         self.draw_circle_measurements = False
         self.draw_particles = True
+        self.draw_heatmap = PARTICLE_RENDER_MODE == "heatmap"
+
+        # the obstacles never move, so they are drawn once onto a background that every frame starts from
+        self.background = pygame.Surface((width, height))
+        self.background.fill(self.white)
+        for obstacle in self.obstacles:
+            self.draw_obstacle(obstacle[0], obstacle[1], 20, 20)
+        self.background_pixels = pygame.surfarray.array3d(self.background) # indexed [x, y]
 
     def draw_obstacle(self, x, y, width, height):
         half_width = width / 2.0
         half_height = height / 2.0
-        pygame.draw.rect(self.screen, self.red, (x-half_width, y-half_height, width, height))
+        pygame.draw.rect(self.background, self.red, (x-half_width, y-half_height, width, height))
 
     def draw_agent(self, x, y, theta, radius, color):
         line_length = 25
         pygame.draw.circle(self.screen, color, [x, y], radius, 0)
         pygame.draw.line(self.screen, self.black, [x, y], [x + line_length * math.cos(theta), y + line_length * math.sin(theta)], 2)
 
-    def draw_robot_obstacles_measurements(self, obstacle_x, obstacle_y):
-        pygame.draw.line(self.screen, (255, 158, 158, 1), [self.robot.x, self.robot.y], [obstacle_x, obstacle_y], 2)
+    def draw_robot_obstacles_measurements(self, robot_x, robot_y, obstacle_x, obstacle_y):
+        pygame.draw.line(self.screen, (255, 158, 158, 1), [robot_x, robot_y], [obstacle_x, obstacle_y], 2)
 
     def draw_circle_obstacles_measurements(self, obstacle_x, obstacle_y, radius):
         pygame.draw.circle(self.screen, (37,156,198,255), [obstacle_x, obstacle_y], radius, 2)
         
 
     def run(self):
+        self.snapshots.attached = True
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -71,36 +83,98 @@ class Environment:
                 else:
                     self.draw_particles = False
 
+            if keys[pygame.K_h]:
+                if self.draw_heatmap == False:
+                    self.draw_heatmap = True
+                else:
+                    self.draw_heatmap = False
+
             if keys[pygame.K_q]:
                 pygame.quit()
                 sys.exit()
 
-            # Draw obstacles on the screen
-            self.screen.fill((self.white))
-            for obstacle in self.obstacles:
-                self.draw_obstacle(obstacle[0], obstacle[1], 20, 20)
-
-
-            #Draw particles on the screen
-            if self.draw_particles:
-                for particle in self.particles:
-                    self.draw_agent(particle.x, particle.y, particle.theta, 10, particle.color)
-            
-            # Draw robot's measurement
-            if self.draw_robot_measurements:
-                for obstacle in self.obstacles:
-                    self.draw_robot_obstacles_measurements(obstacle[0], obstacle[1])
-
-            if self.draw_circle_measurements:
-                for obstacle in self.obstacles:
-                    self.draw_circle_obstacles_measurements(obstacle[0], obstacle[1], math.sqrt((obstacle[0] - self.robot.x)**2 + (obstacle[1] - self.robot.y)**2))
-                    
-
-            # Draw the robot on the screen
-            self.draw_agent(self.robot.x, self.robot.y, self.robot.theta, 10, self.robot.color)
+            # latest complete step from the filter thread
+            snapshot = self.snapshots.latest()
+            if snapshot is not None:
+                self.draw_snapshot(snapshot)
 
             # Update display
             pygame.display.flip()
 
             # Control the game loop speed
-            self.clock.tick(30)
\ No newline at end of file
+            self.clock.tick(30)
+
+    def draw_snapshot(self, snapshot):
+        # Draw obstacles and particles on the screen
+        # a few particles are drawn one by one like the robot, beyond PARTICLE_RENDER_THRESHOLD they are written into the pixels in bulk
+        if not self.draw_particles:
+            self.screen.blit(self.background, (0, 0))
+        elif self.draw_heatmap:
+            self.draw_particle_heatmap(snapshot)
+        elif PARTICLE_RENDER_MODE == "circles" or (PARTICLE_RENDER_MODE == "auto" and len(snapshot.x) <= PARTICLE_RENDER_THRESHOLD):
+            self.screen.blit(self.background, (0, 0))
+            for x, y, theta in zip(snapshot.x.tolist(), snapshot.y.tolist(), snapshot.theta.tolist()):
+                self.draw_agent(x, y, theta, 10, snapshot.particle_color)
+        else:
+            self.draw_particle_points(snapshot)
+
+        # Draw robot's measurement
+        if self.draw_robot_measurements:
+            for obstacle in self.obstacles:
+                self.draw_robot_obstacles_measurements(snapshot.robot_x, snapshot.robot_y, obstacle[0], obstacle[1])
+
+        if self.draw_circle_measurements:
+            for obstacle in self.obstacles:
+                self.draw_circle_obstacles_measurements(obstacle[0], obstacle[1], math.sqrt((obstacle[0] - snapshot.robot_x)**2 + (obstacle[1] - snapshot.robot_y)**2))
+
+        # Draw the robot on the screen
+        self.draw_agent(snapshot.robot_x, snapshot.robot_y, snapshot.robot_theta, 10, snapshot.robot_color)
+
+    # number of particles in each cell_size square of the screen, indexed [x, y] like surfarray, particles off the screen are left out
+    def particle_counts(self, snapshot, cell_size=1):
+        columns, rows = math.ceil(self.width / cell_size), math.ceil(self.height / cell_size)
+        col = np.floor(snapshot.x / cell_size).astype(np.int64)
+        row = np.floor(snapshot.y / cell_size).astype(np.int64)
+        on_screen = (col >= 0) & (col < columns) & (row >= 0) & (row < rows)
+        return np.bincount(col[on_screen] * rows + row[on_screen], minlength=columns * rows).reshape(columns, rows)
+
+    # every particle as a small square of pixels in its color, and heading lines for the top weighted ones
+    def draw_particle_points(self, snapshot):
+        occupied = self.particle_counts(snapshot) > 0
+
+        # grow each pixel to a square of PARTICLE_POINT_SIZE so single particles stay visible
+        grown = occupied.copy()
+        for offset in range(1, PARTICLE_POINT_SIZE):
+            grown[offset:, :] |= occupied[:-offset, :]
+        occupied = grown.copy()
+        for offset in range(1, PARTICLE_POINT_SIZE):
+            grown[:, offset:] |= occupied[:, :-offset]
+
+        color = np.array(pygame.Color(snapshot.particle_color)[:3], dtype=np.uint8)
+        pygame.surfarray.blit_array(self.screen, np.where(grown[:, :, None], color, self.background_pixels))
+        self.draw_heading_ticks(snapshot)
+
+    # particle density over the background, one translucent square per cell, denser cells are more opaque
+    # the blending is left to pygame: the overlay is built at cell resolution and scaled up to the screen
+    def draw_particle_heatmap(self, snapshot):
+        counts = self.particle_counts(snapshot, PARTICLE_HEATMAP_CELL_SIZE)
+        density = np.sqrt(counts / max(counts.max(), 1))
+
+        overlay = pygame.Surface(counts.shape, pygame.SRCALPHA)
+        overlay.fill(snapshot.particle_color)
+        alpha = pygame.surfarray.pixels_alpha(overlay)
+        alpha[:] = np.where(counts > 0, 64 + 191 * density, 0).astype(np.uint8)
+        del alpha # unlocks the overlay
+
+        self.screen.blit(self.background, (0, 0))
+        self.screen.blit(pygame.transform.scale(overlay, (counts.shape[0] * PARTICLE_HEATMAP_CELL_SIZE, counts.shape[1] * PARTICLE_HEATMAP_CELL_SIZE)), (0, 0))
+        self.draw_heading_ticks(snapshot)
+
+    # heading lines are the expensive part of a particle, only the PARTICLE_HEADING_TOP_K highest weighted particles get one
+    def draw_heading_ticks(self, snapshot):
+        k = min(PARTICLE_HEADING_TOP_K, len(snapshot.weight))
+        if k == 0:
+            return
+        top = np.argpartition(snapshot.weight, len(snapshot.weight) - k)[-k:]
+        for x, y, theta in zip(snapshot.x[top].tolist(), snapshot.y[top].tolist(), snapshot.theta[top].tolist()):
+            pygame.draw.line(self.screen, self.black, [x, y], [x + 15 * math.cos(theta), y + 15 * math.sin(theta)], 1)
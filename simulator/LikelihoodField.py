@@ -0,0 +1,146 @@
+import json
+import math
+import struct
+import numpy as np
+from conf import *
+
+# header of the control machine's binary map files, same layout as raspberrypi/control-machine/MapFile.py
+MAP_FILE_MAGIC = b"PFMAP\0"
+MAP_FILE_VERSION = 1
+MAP_FILE_HEADER = struct.Struct("<6sHIIiiiiIIQQQQ")
+
+# Likelihood field measurement model
+# the distance from every cell of the map to the nearest occupied cell is worked out once (a distance transform),
+# so scoring a beam endpoint is a single grid lookup no matter how many obstacles/wall cells the map has
+class LikelihoodField:
+    def __init__(self, occupancy, resolution, sigma=DISTANCE_SIGMA, max_range=LIKELIHOOD_FIELD_MAX_RANGE):
+        self.occupancy = np.asarray(occupancy, dtype=bool) # indexed [row, col] = [y, x]
+        self.resolution = resolution # world units per grid cell
+        self.sigma = sigma
+        self.max_range = max_range
+
+        self.distances = distance_transform(self.occupancy) * resolution
+
+        # log of a mix between a normal distribution around the nearest obstacle and a uniform random reading,
+        # the random part keeps a single bad beam from ruling out an otherwise good particle
+        hit = LIKELIHOOD_FIELD_Z_HIT * np.exp(-self.distances ** 2 / (2 * sigma ** 2)) / math.sqrt(2 * math.pi * sigma ** 2)
+        self.random_log_likelihood = math.log(LIKELIHOOD_FIELD_Z_RANDOM / max_range)
+        self.log_likelihoods = np.log(hit + LIKELIHOOD_FIELD_Z_RANDOM / max_range).astype(np.float32)
+
+    # the simulator world: every obstacle is a square of obstacle_size, same as Environment.draw_obstacle
+    @classmethod
+    def from_obstacles(cls, obstacles, width=WIDTH, height=HEIGHT, obstacle_size=20, resolution=LIKELIHOOD_FIELD_RESOLUTION, **kwargs):
+        rows, cols = math.ceil(height / resolution), math.ceil(width / resolution)
+        occupancy = np.zeros((rows, cols), dtype=bool)
+        half_size = obstacle_size / 2.0
+
+        for x, y in obstacles:
+            col_start, col_end = max(int((x - half_size) // resolution), 0), min(int((x + half_size) // resolution) + 1, cols)
+            row_start, row_end = max(int((y - half_size) // resolution), 0), min(int((y + half_size) // resolution) + 1, rows)
+            occupancy[row_start:row_end, col_start:col_end] = True
+
+        return cls(occupancy, resolution, **kwargs)
+
+    # an occupancy grid such as the pooled floorplan from frontend/generatemap.py, any non-zero cell is occupied
+    @classmethod
+    def from_occupancy_grid(cls, grid, cell_size, **kwargs):
+        return cls(np.asarray(grid) != 0, cell_size, **kwargs)
+
+    # a map saved by the control machine's MapUI: obstacles are [x, y] grid cells
+    @classmethod
+    def from_map_json(cls, file_path, cell_size=MAP_CELL_SIZE, **kwargs):
+        with open(file_path, "r") as file:
+            map_data = json.load(file)
+
+        cols = map_data["dimensions"]["width"] // cell_size
+        rows = map_data["dimensions"]["height"] // cell_size
+        occupancy = np.zeros((rows, cols), dtype=bool)
+        for x, y in map_data["obstacles"]:
+            occupancy[y, x] = True
+
+        return cls(occupancy, cell_size, **kwargs)
+
+    # a binary map saved by MapUI (.pfmap, see raspberrypi/control-machine/MapFile.py for the layout):
+    # the bit-packed occupancy is memory-mapped and unpacked in one go instead of parsing obstacle pairs
+    @classmethod
+    def from_map_file(cls, file_path, cell_size=MAP_CELL_SIZE, **kwargs):
+        with open(file_path, "rb") as file:
+            header = MAP_FILE_HEADER.unpack(file.read(MAP_FILE_HEADER.size))
+        magic, version, cols, rows = header[:4]
+        bitmap_offset = header[10]
+        if magic != MAP_FILE_MAGIC or version != MAP_FILE_VERSION:
+            raise ValueError(f"{file_path} is not a version {MAP_FILE_VERSION} map file")
+
+        bitmap = np.memmap(file_path, dtype=np.uint8, mode="r", offset=bitmap_offset, shape=(rows, (cols + 7) // 8))
+        occupancy = np.unpackbits(bitmap, axis=1, count=cols).astype(bool)
+        return cls(occupancy, cell_size, **kwargs)
+
+    # log-likelihood of beam endpoints at world coordinates x, y (any shape), endpoints off the map count as random readings
+    def lookup(self, x, y):
+        col = np.floor(np.asarray(x) / self.resolution).astype(np.int64)
+        row = np.floor(np.asarray(y) / self.resolution).astype(np.int64)
+        on_map = (col >= 0) & (col < self.occupancy.shape[1]) & (row >= 0) & (row < self.occupancy.shape[0])
+
+        values = np.full(col.shape, self.random_log_likelihood, dtype=np.float32)
+        values[on_map] = self.log_likelihoods[row[on_map], col[on_map]]
+        return values
+
+    # summed log-likelihood of a scan for each particle pose (x, y, theta are arrays)
+    # ranges are the robot's readings, beams that didn't hit anything (max range) carry no information and are skipped
+    # the robot's measurement noise is left to sigma: particle noise is redrawn at every resample, so a particle can't hold on to a guess of it
+    def score(self, x, y, theta, ranges, beam_angles):
+        ranges = np.asarray(ranges, dtype=np.float64)
+        beam_angles = np.asarray(beam_angles, dtype=np.float64)
+        hits = ranges < self.max_range
+        ranges, beam_angles = ranges[hits], beam_angles[hits]
+
+        angles = np.asarray(theta)[:, None] + beam_angles
+        endpoint_x = np.asarray(x)[:, None] + ranges * np.cos(angles)
+        endpoint_y = np.asarray(y)[:, None] + ranges * np.sin(angles)
+
+        return self.lookup(endpoint_x, endpoint_y).sum(axis=1, dtype=np.float64)
+
+    # distance along each beam to the first occupied cell (max_range if nothing is hit), used to simulate the robot's sensor
+    def raycast(self, x, y, theta, beam_angles):
+        step = self.resolution / 2.0
+        steps = np.arange(step, self.max_range, step)
+        angles = theta + np.asarray(beam_angles, dtype=np.float64)
+
+        col = np.floor((x + np.cos(angles)[:, None] * steps) / self.resolution).astype(np.int64)
+        row = np.floor((y + np.sin(angles)[:, None] * steps) / self.resolution).astype(np.int64)
+        on_map = (col >= 0) & (col < self.occupancy.shape[1]) & (row >= 0) & (row < self.occupancy.shape[0])
+
+        occupied = np.zeros(col.shape, dtype=bool)
+        occupied[on_map] = self.occupancy[row[on_map], col[on_map]]
+
+        first_hit = np.argmax(occupied, axis=1)
+        return np.where(occupied.any(axis=1), steps[first_hit], self.max_range)
+
+# beam directions relative to the robot's heading, spread evenly around the robot
+def beam_angles(num_beams=LIKELIHOOD_FIELD_NUM_BEAMS):
+    return np.linspace(-math.pi, math.pi, num_beams, endpoint=False)
+
+# exact euclidean distance (in cells) from every cell to the nearest occupied cell, worked out separably:
+# first the distance to the nearest occupied cell in the same column, then the closest combination along each row
+def distance_transform(occupancy):
+    rows, cols = occupancy.shape
+    if not occupancy.any():
+        return np.full(occupancy.shape, np.inf)
+
+    # nearest occupied cell above and below each cell in its column
+    row_index = np.arange(rows, dtype=np.float64)[:, None]
+    above = np.maximum.accumulate(np.where(occupancy, row_index, -np.inf), axis=0)
+    below = np.minimum.accumulate(np.where(occupancy, row_index, np.inf)[::-1], axis=0)[::-1]
+    column_distance = np.minimum(row_index - above, below - row_index)
+    column_distance_squared = column_distance ** 2
+
+    # d^2(row, col) = min over c of (col - c)^2 + column_distance(row, c)^2, a block of rows at a time to bound memory
+    col_index = np.arange(cols, dtype=np.float64)
+    col_offset_squared = (col_index[:, None] - col_index[None, :]) ** 2
+    rows_per_block = max(1, 4_000_000 // (cols * cols))
+    distances_squared = np.empty(occupancy.shape)
+    for start in range(0, rows, rows_per_block):
+        block = column_distance_squared[start:start + rows_per_block]
+        distances_squared[start:start + rows_per_block] = np.min(block[:, None, :] + col_offset_squared, axis=2)
+
+    return np.sqrt(distances_squared)
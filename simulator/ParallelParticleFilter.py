@@ -0,0 +1,133 @@
+import multiprocessing
+import random
+import numpy as np
+from multiprocessing.sharedctypes import RawArray
+from ParticleFilter import *
+
+SHARED_FIELDS = ("x", "y", "theta", "weight", "noise_linear", "noise_angular", "noise_measurement", "log_likelihood")
+
+# attribute stored in the shared buffer, assigning an array copies it in instead of rebinding the attribute
+def shared_field(name):
+    def get(self):
+        return self.buffers[name][:self.count]
+
+    def set(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        self.buffers[name][:len(value)] = value
+        self.count = len(value)
+
+    return property(get, set)
+
+# ParticleArray whose arrays live in one block of shared memory, so worker processes read and write the particles in place
+# allocated once for the largest particle count the filter can reach (KLD-sampling can grow it up to its max)
+class SharedParticleArray(ParticleArray):
+    x = shared_field("x")
+    y = shared_field("y")
+    theta = shared_field("theta")
+    weight = shared_field("weight")
+    noise_linear = shared_field("noise_linear")
+    noise_angular = shared_field("noise_angular")
+    noise_measurement = shared_field("noise_measurement")
+    log_likelihood = shared_field("log_likelihood") # scratch space for the workers' weighting results
+
+    def __init__(self, num_particles, color, rng, capacity, noise_ranges=None):
+        self.raw = RawArray("d", len(SHARED_FIELDS) * capacity)
+        self.capacity = capacity
+        self.set_buffers(shared_buffers(self.raw, capacity), 0, capacity)
+        super().__init__(num_particles, color, rng, noise_ranges)
+
+    def set_buffers(self, buffers, start, stop):
+        self.buffers = {name: buffers[i, start:stop] for i, name in enumerate(SHARED_FIELDS)}
+        self.count = 0
+
+    # the particles in [start, stop) of the shared buffers, what a worker process works on
+    @classmethod
+    def shard(cls, buffers, start, stop):
+        shard = cls.__new__(cls)
+        shard.set_buffers(buffers, start, stop)
+        shard.count = stop - start
+        return shard
+
+def shared_buffers(raw, capacity):
+    return np.frombuffer(raw, dtype=np.float64).reshape(len(SHARED_FIELDS), capacity)
+
+# Worker process state: the shared particle buffers and a copy of the filter (settings, obstacles, likelihood field)
+# both are handed over once when the pool starts, each step only sends shard bounds and the robot's measurement
+worker_buffers = None
+worker_filter = None
+
+def init_worker(raw, capacity, particle_filter):
+    global worker_buffers, worker_filter
+    worker_buffers = shared_buffers(raw, capacity)
+    worker_filter = particle_filter
+
+def move_shard(start, stop, dist, rot):
+    SharedParticleArray.shard(worker_buffers, start, stop).move(dist, rot)
+
+def weigh_shard(start, stop, measurement, robot_theta, resampled):
+    shard = SharedParticleArray.shard(worker_buffers, start, stop)
+    worker_filter.particles = shard
+    worker_filter.robot.theta = robot_theta
+    worker_filter.resampled = resampled
+
+    if worker_filter.sensor_model == "obstacles" and worker_filter.weighting_mode == "product":
+        worker_filter.update_particle_weights_array(measurement)
+    else:
+        shard.log_likelihood = worker_filter.get_log_likelihoods(measurement)
+
+# ParticleFilter with motion and weighting split into shards across a process pool
+# normalization, resampling and KLD-sampling happen in this process at the barrier after each parallel stage
+class ParallelParticleFilter(ParticleFilter):
+    def __init__(self, num_particles: int, robot: Robot, obstacles: List[Tuple[float, float]], num_workers: int = NUM_WORKERS, **kwargs) -> None:
+        self.num_workers = num_workers
+        super().__init__(num_particles, robot, obstacles, backend="numpy", **kwargs)
+
+        self.pool = multiprocessing.Pool(
+            num_workers,
+            initializer=init_worker,
+            initargs=(self.particles.raw, self.particles.capacity, self),
+        )
+
+    def create_particles(self) -> SharedParticleArray:
+        capacity = max(self.num_particles, self.kld_max_particles) if self.kld_sampling else self.num_particles
+        noise_ranges = (self.noise_linear_range, self.noise_angular_range, self.noise_measurement_range)
+        return SharedParticleArray(self.num_particles, PARTICLE_COLOR, self.rng, capacity, noise_ranges)
+
+    # workers get a copy of the filter without the particles and the pool, those are shared separately (and no snapshots, only this process renders)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["particles"]
+        state.pop("pool", None)
+        state.pop("snapshots", None)
+        return state
+
+    # run function(start, stop, *args) over every shard and wait for all of them
+    def run_on_shards(self, function, *args) -> None:
+        bounds = np.linspace(0, len(self.particles), self.num_workers * SHARDS_PER_WORKER + 1).astype(int)
+        self.pool.starmap(function, [(start, stop, *args) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start])
+
+    def apply_movement(self) -> None:
+        # randomly get the linear and angular motion data to move both the robot and particles
+        dist = random.uniform(*MOVEMENT_DISTANCE_RANGE)
+        rot = random.uniform(*MOVEMENT_ROTATION_RANGE)
+
+        self.robot.move(dist, rot)
+        self.run_on_shards(move_shard, dist, rot)
+
+    def update_particle_weights(self) -> None:
+        measurement = self.observe_robot()
+        self.run_on_shards(weigh_shard, measurement, self.robot.theta, self.resampled)
+
+        # product weights are final once every shard is done, log-likelihoods still need normalizing over all shards
+        if not (self.sensor_model == "obstacles" and self.weighting_mode == "product"):
+            self.set_log_weights(self.particles.log_likelihood.copy())
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
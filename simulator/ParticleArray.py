@@ -0,0 +1,99 @@
+import math
+import random
+import numpy as np
+from conf import *
+from helper import *
+
+# read-only view of a single particle, so code written against Robot (e.g. Environment) can still iterate the particles
+class ParticleView:
+    __slots__ = ("_particles", "_i")
+
+    def __init__(self, particles, i):
+        self._particles = particles
+        self._i = i
+
+    @property
+    def x(self):
+        return float(self._particles.x[self._i])
+
+    @property
+    def y(self):
+        return float(self._particles.y[self._i])
+
+    @property
+    def theta(self):
+        return float(self._particles.theta[self._i])
+
+    @property
+    def weight(self):
+        return float(self._particles.weight[self._i])
+
+    @property
+    def color(self):
+        return self._particles.color
+
+# structure-of-arrays version of a list of Robot objects
+# every particle attribute lives in its own numpy array so move/observe run as whole-array operations
+class ParticleArray:
+    def __init__(self, num_particles, color, rng=None, noise_ranges=None):
+        # seed from the global random module so random.seed() still makes a run reproducible
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+        self.color = color
+        self.noise_linear_range, self.noise_angular_range, self.noise_measurement_range = noise_ranges or (
+            PARTICLE_NOISE_LINEAR_RANGE, PARTICLE_NOISE_ANGULAR_RANGE, PARTICLE_NOISE_MEASUREMENT_RANGE)
+
+        n = num_particles
+        self.x = self.rng.integers(0, WIDTH, n, endpoint=True).astype(np.float64)
+        self.y = self.rng.integers(0, HEIGHT, n, endpoint=True).astype(np.float64)
+        self.theta = self.rng.uniform(-math.pi, math.pi, n)
+        self.weight = np.zeros(n)
+
+        # each particle follows the same error distribution as the robot
+        self.regenerate_noise()
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        return ParticleView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ParticleView(self, i)
+
+    # draw fresh noise for every particle, sized to the current particle count
+    def regenerate_noise(self):
+        n = len(self.x)
+        self.noise_linear = self.rng.uniform(*self.noise_linear_range, n)
+        self.noise_angular = self.rng.uniform(*self.noise_angular_range, n)
+        self.noise_measurement = self.rng.uniform(*self.noise_measurement_range, n)
+
+    # same motion model as Robot.move, applied to every particle at once
+    def move(self, dist, rot):
+        angle = normalize_angle_radians_array(self.theta + self.noise_angular)
+
+        new_x = self.x + (dist * np.cos(angle) + self.noise_linear)
+        new_y = self.y + (dist * np.sin(angle) + self.noise_linear)
+
+        # check boundaries and loop around if necessary
+        new_x[new_x > WIDTH] = 0
+        new_x[new_x < 0] = WIDTH
+        new_y[new_y > HEIGHT] = 0
+        new_y[new_y < 0] = HEIGHT
+
+        self.x = new_x
+        self.y = new_y
+        self.theta = self.theta + rot
+
+    # same as Robot.observe but returns a (particles x obstacles) matrix
+    # rows can be limited with a slice so large particle sets are observed in chunks
+    def observe(self, obstacles, rows=slice(None)):
+        obstacles = np.asarray(obstacles, dtype=np.float64).reshape(-1, 2)
+        distances = np.subtract.outer(self.x[rows], obstacles[:, 0])
+        distances *= distances
+        dy = np.subtract.outer(self.y[rows], obstacles[:, 1])
+        dy *= dy
+        distances += dy
+        np.sqrt(distances, out=distances)
+        distances += self.noise_measurement[rows, None]
+        return distances
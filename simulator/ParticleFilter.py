@@ -1,23 +1,85 @@
 import random
 import time
+import numpy as np
 from Robot import *
+from ParticleArray import *
+from resampling import *
+from LikelihoodField import *
+from Snapshot import *
 from typing import *
 from conf import *
 from helper import *
 from tabulate import tabulate
 
 class ParticleFilter:
-    def __init__(self, num_particles: int, robot: Robot, obstacles: List[Tuple[float, float]]) -> None:
+    def __init__(self, num_particles: int, robot: Robot, obstacles: List[Tuple[float, float]], backend: str = PARTICLE_BACKEND,
+                 resampling_method: str = RESAMPLING_METHOD, resample_threshold: float = RESAMPLE_ESS_THRESHOLD,
+                 weighting_mode: str = WEIGHTING_MODE, kld_sampling: bool = KLD_SAMPLING,
+                 sensor_model: str = SENSOR_MODEL, likelihood_field: Optional[LikelihoodField] = None,
+                 distance_sigma: float = DISTANCE_SIGMA, heading_sigma: float = HEADING_SIGMA,
+                 noise_ranges: Tuple[List[float], List[float], List[float]] = (PARTICLE_NOISE_LINEAR_RANGE, PARTICLE_NOISE_ANGULAR_RANGE, PARTICLE_NOISE_MEASUREMENT_RANGE)) -> None:
         self.num_particles = num_particles
         self.robot = robot
         self.obstacles = obstacles # act as reference points for the robot to estimate its position
 
+        if backend not in ("python", "numpy"):
+            raise ValueError(f"Unknown particle backend: {backend}")
+        if resampling_method not in RESAMPLING_METHODS:
+            raise ValueError(f"Unknown resampling method: {resampling_method}")
+        if weighting_mode not in ("product", "log"):
+            raise ValueError(f"Unknown weighting mode: {weighting_mode}")
+        if sensor_model not in ("obstacles", "likelihood_field"):
+            raise ValueError(f"Unknown sensor model: {sensor_model}")
+        self.backend = backend
+        self.resampling_method = resampling_method
+        self.resample_threshold = resample_threshold
+        self.weighting_mode = weighting_mode
+        self.sensor_model = sensor_model
+        self.distance_sigma = distance_sigma
+        self.heading_sigma = heading_sigma
+        self.noise_linear_range, self.noise_angular_range, self.noise_measurement_range = noise_ranges
+        self.obstacles_array = np.asarray(obstacles, dtype=np.float64).reshape(-1, 2)
+
+        # likelihood field model: built from the obstacles unless a map (e.g. a floorplan) is passed in
+        if sensor_model == "likelihood_field":
+            self.likelihood_field = likelihood_field or LikelihoodField.from_obstacles(obstacles, sigma=distance_sigma)
+            self.beam_angles = beam_angles()
+
+        # log mode: the normal distribution constants only depend on the sigmas, so they are worked out once here
+        self.distance_precision = 1 / (2 * distance_sigma ** 2)
+        self.heading_precision = 1 / (2 * heading_sigma ** 2)
+        self.observation_log_constant = len(obstacles) * log_normal_constant(distance_sigma) + log_normal_constant(heading_sigma)
+
+        # KLD-sampling, the particle count moves between the min and max bounds at every resample
+        self.kld_sampling = kld_sampling
+        self.kld_bin_size = (KLD_BIN_SIZE_XY, KLD_BIN_SIZE_XY, KLD_BIN_SIZE_THETA)
+        self.kld_epsilon = KLD_EPSILON
+        self.kld_delta = KLD_DELTA
+        self.kld_min_particles = KLD_MIN_PARTICLES
+        self.kld_max_particles = KLD_MAX_PARTICLES
+
+        # seeded from the global random module so random.seed() still makes a run reproducible
+        self.rng = np.random.default_rng(random.getrandbits(64))
         self.particles = self.create_particles()
 
+        # weights only carry over between steps while we skip resampling, right after resampling every particle is equally likely
+        self.resampled = True
+
+        # the renderer draws copies of the state published here instead of reading the particles while they are being updated,
+        # the run loops only publish once a renderer is attached to the buffer
+        self.snapshots = SnapshotBuffer()
+        self.num_steps = 0
+        self.stopped = False # set to end run_particle_filter after the current step
+        self.publish_snapshot()
+
         self.difference_error = [] # diagnostics: store the difference error for each time step
+        self.particle_counts = [] # diagnostics: store the number of particles for each time step
 
     # particles are essentially just simulated robots
-    def create_particles(self) -> List[Robot]:
+    def create_particles(self) -> Union[List[Robot], ParticleArray]:
+        if self.backend == "numpy":
+            return ParticleArray(self.num_particles, PARTICLE_COLOR, self.rng, (self.noise_linear_range, self.noise_angular_range, self.noise_measurement_range))
+
         particles = []
         for _ in range(self.num_particles):
             particle = Robot(
@@ -26,9 +88,9 @@ class ParticleFilter:
                 theta = random.uniform(-math.pi, math.pi), # doesn't this get normalized in radians anyway, so why not use radians?
                 color = PARTICLE_COLOR,
                 # each particle follows the same error distribution as the robot
-                noise_linear = random.uniform(*PARTICLE_NOISE_LINEAR_RANGE),
-                noise_angular = random.uniform(*PARTICLE_NOISE_ANGULAR_RANGE),
-                noise_measurement = random.uniform(*PARTICLE_NOISE_MEASUREMENT_RANGE)
+                noise_linear = random.uniform(*self.noise_linear_range),
+                noise_angular = random.uniform(*self.noise_angular_range),
+                noise_measurement = random.uniform(*self.noise_measurement_range)
             )
             particles.append(particle)
         return particles
@@ -42,11 +104,30 @@ class ParticleFilter:
         self.robot.move(dist, rot)
 
         # move each particle
+        if self.backend == "numpy":
+            self.particles.move(dist, rot)
+            return
         for particle in self.particles:
             particle.move(dist, rot)
 
     def update_particle_weights(self) -> None:
-        robot_distances = self.robot.observe(self.obstacles)
+        measurement = self.observe_robot()
+
+        if self.sensor_model == "obstacles" and self.weighting_mode == "product":
+            self.update_particle_product_weights(measurement)
+            return
+        self.set_log_weights(self.get_log_likelihoods(measurement))
+
+    # what the robot reports this step: distances to every obstacle, or beam ranges for the likelihood field model
+    def observe_robot(self) -> np.ndarray:
+        if self.sensor_model == "likelihood_field":
+            return self.robot.scan(self.likelihood_field, self.beam_angles)
+        return np.asarray(self.robot.observe(self.obstacles), dtype=np.float64)
+
+    def update_particle_product_weights(self, robot_distances: np.ndarray) -> None:
+        if self.backend == "numpy":
+            self.update_particle_weights_array(robot_distances)
+            return
 
         # for each particle, check how good of an estimation it is compared to the robot's reported distance and heading
         for particle in self.particles:
@@ -55,52 +136,222 @@ class ParticleFilter:
 
             # scale likelihood using a normal distribution with the actual robot's measurements as a reference point
             for robot_dist, particle_dist in zip(robot_distances, particle_distances): # compare all distances
-                likelihood *= normal_distribution(robot_dist, DISTANCE_SIGMA, particle_dist)
-            likelihood *= normal_distribution(self.robot.theta, HEADING_SIGMA, particle.theta) # compare heading angles
+                likelihood *= normal_distribution(robot_dist, self.distance_sigma, particle_dist)
+            likelihood *= normal_distribution(self.robot.theta, self.heading_sigma, particle.theta) # compare heading angles
+
+            particle.weight = likelihood if self.resampled else particle.weight * likelihood
+
+    # same weighting as update_particle_product_weights, computed over blocks of particles at once
+    def update_particle_weights_array(self, robot_distances: np.ndarray) -> None:
+        particles = self.particles
+
+        for start in range(0, len(particles), PARTICLE_CHUNK_SIZE):
+            rows = slice(start, start + PARTICLE_CHUNK_SIZE)
+            particle_distances = particles.observe(self.obstacles_array, rows)
+
+            # normal_distribution(robot_dist, distance_sigma, particle_dist) for every pair, worked out in place to avoid temporaries
+            pair_likelihood = particle_distances
+            pair_likelihood -= robot_distances
+            pair_likelihood *= pair_likelihood
+            pair_likelihood *= -self.distance_precision
+            np.exp(pair_likelihood, out=pair_likelihood)
+            pair_likelihood *= 1 / math.sqrt(2 * math.pi * self.distance_sigma ** 2)
+
+            likelihood = np.prod(pair_likelihood, axis=1)
+            likelihood *= normal_distribution_array(self.robot.theta, self.heading_sigma, particles.theta[rows])
+
+            if self.resampled:
+                particles.weight[rows] = likelihood
+            else:
+                particles.weight[rows] *= likelihood
+
+    # same comparison as update_particle_product_weights but summed in log space, so many obstacles can't underflow the weights to 0
+    def get_log_likelihoods(self, measurement: np.ndarray) -> np.ndarray:
+        if self.sensor_model == "likelihood_field":
+            return self.get_log_likelihoods_likelihood_field(measurement)
+        if self.backend == "numpy":
+            return self.get_log_likelihoods_array(measurement)
+
+        log_likelihoods = []
+        for particle in self.particles:
+            particle_distances = particle.observe(self.obstacles)
+            squared_residuals = sum((robot_dist - particle_dist) ** 2 for robot_dist, particle_dist in zip(measurement, particle_distances))
+            log_likelihoods.append(self.log_likelihood(squared_residuals, particle.theta))
+        return np.array(log_likelihoods)
+
+    # likelihood field model: the cost per particle depends on the number of beams, not on the number of obstacles
+    # always weighted in log space, the grid already holds log-likelihoods
+    def get_log_likelihoods_likelihood_field(self, robot_ranges: np.ndarray) -> np.ndarray:
+        x, y, theta = (self.get_particle_array(attribute) for attribute in ("x", "y", "theta"))
+        log_likelihoods = np.empty(len(x))
+
+        for start in range(0, len(x), PARTICLE_CHUNK_SIZE):
+            rows = slice(start, start + PARTICLE_CHUNK_SIZE)
+            log_likelihoods[rows] = self.likelihood_field.score(x[rows], y[rows], theta[rows], robot_ranges, self.beam_angles)
+        log_likelihoods += log_normal_constant(self.heading_sigma) - (self.robot.theta - theta) ** 2 * self.heading_precision # compare heading angles
 
-            particle.weight = likelihood
+        return log_likelihoods
+
+    def set_log_weights(self, log_likelihoods: np.ndarray) -> None:
+        # weights only carry over while resampling is skipped
+        if not self.resampled:
+            with np.errstate(divide="ignore"):
+                log_likelihoods += np.log(self.get_normalized_weights())
+
+        # normalize with log-sum-exp, the best particle always ends up with a weight that doesn't underflow
+        weights = np.exp(log_likelihoods - log_sum_exp(log_likelihoods))
+        if self.backend == "numpy":
+            self.particles.weight = weights
+        else:
+            for particle, weight in zip(self.particles, weights):
+                particle.weight = float(weight)
+
+    def get_log_likelihoods_array(self, robot_distances: np.ndarray) -> np.ndarray:
+        particles = self.particles
+        log_likelihoods = np.empty(len(particles))
+
+        for start in range(0, len(particles), PARTICLE_CHUNK_SIZE):
+            rows = slice(start, start + PARTICLE_CHUNK_SIZE)
+            residuals = particles.observe(self.obstacles_array, rows)
+            residuals -= robot_distances
+            residuals *= residuals
+            log_likelihoods[rows] = self.log_likelihood(residuals.sum(axis=1), particles.theta[rows])
+
+        return log_likelihoods
+
+    # log of the product of normal_distribution over every obstacle distance and the heading, given the summed squared distance residuals
+    def log_likelihood(self, squared_residuals, theta):
+        return self.observation_log_constant - squared_residuals * self.distance_precision - (self.robot.theta - theta) ** 2 * self.heading_precision
 
     # create new generation of particles based on the weights of the previous generation
+    # skipped while the effective sample size shows the weights are still spread over enough particles
     def regenerate_particles(self) -> None:
-        total_weight = sum(particle.weight for particle in self.particles) or 1
-        normalized_weights = [particle.weight / total_weight for particle in self.particles] # store the normalized weight for each particle
+        weights = self.get_normalized_weights()
+        if effective_sample_size(weights) >= self.resample_threshold * len(weights):
+            self.resampled = False
+            return
+
+        resample = RESAMPLING_METHODS[self.resampling_method]
+        if self.kld_sampling:
+            selected = self.kld_select(resample(weights, self.rng, self.kld_max_particles))
+        else:
+            selected = resample(weights, self.rng)
+
+        if self.backend == "numpy":
+            self.regenerate_particles_array(selected)
+        else:
+            self.regenerate_particles_list(selected)
+        self.resampled = True
+
+    # KLD-sampling: take resampled candidates one at a time until there are enough particles for the number of
+    # histogram bins they cover, a tight belief fills few bins and needs few particles
+    def kld_select(self, candidates: np.ndarray) -> np.ndarray:
+        # systematic/stratified/residual return candidates in index order, shuffle so every prefix is a fair sample
+        candidates = self.rng.permutation(candidates)
+        x, y, theta = self.get_particle_poses(candidates)
+
+        bins = np.stack([
+            np.floor(x / self.kld_bin_size[0]),
+            np.floor(y / self.kld_bin_size[1]),
+            np.floor(normalize_angle_radians_array(theta) / self.kld_bin_size[2]),
+        ], axis=1)
+        _, first_in_bin = np.unique(bins, axis=0, return_index=True)
+
+        # number of non-empty bins after taking the first n candidates, and the sample size that many bins need
+        new_bin = np.zeros(len(candidates), dtype=bool)
+        new_bin[first_in_bin] = True
+        non_empty_bins = np.cumsum(new_bin)
+        required = np.maximum(kld_sample_size(non_empty_bins, self.kld_epsilon, self.kld_delta), self.kld_min_particles)
 
-        new_particles = [ self.select_particle(normalized_weights) for _ in range(len(self.particles)) ]
+        enough = np.flatnonzero(np.arange(1, len(candidates) + 1) >= required)
+        num_particles = enough[0] + 1 if len(enough) else len(candidates)
+        return candidates[:num_particles]
+
+    def get_particle_poses(self, selected: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x, y, theta = (self.get_particle_array(attribute) for attribute in ("x", "y", "theta"))
+        return x[selected], y[selected], theta[selected]
+
+    # one particle attribute for every particle as an array, whichever backend holds the particles
+    def get_particle_array(self, attribute: str) -> np.ndarray:
+        if self.backend == "numpy":
+            return getattr(self.particles, attribute)
+        return np.array([getattr(particle, attribute) for particle in self.particles], dtype=np.float64)
+
+    def regenerate_particles_list(self, selected: np.ndarray) -> None:
+        # copy the selected particles first, a particle can be selected after its own slot was already overwritten
+        new_particles = [
+            (p.x, p.y, p.theta, p.color, p.weight, p.noise_linear, p.noise_angular)
+            for p in (self.particles[j] for j in selected)
+        ]
+
+        # KLD-sampling can change the particle count, resize the list in place since the Environment holds on to it
+        del self.particles[len(new_particles):]
+        while len(self.particles) < len(new_particles):
+            self.particles.append(Robot(0, 0, 0, PARTICLE_COLOR, 0, 0, 0))
 
         # update the particles to the newly sampled ones and add (deadreckoning?) noise
-        for i, new_particle in enumerate(new_particles):
-            if new_particle is None: # TODO: idk what's going on here, if NUM_PARTICLES is like 100 it's fine but if it's like 10 it's wonky??
-                continue
+        for particle, (x, y, theta, color, weight, noise_linear, noise_angular) in zip(self.particles, new_particles):
             # TODO: understand noise better, it breaks if you don't add the noise here and idk why
-            self.particles[i].x = new_particle.x + new_particle.noise_linear
-            self.particles[i].y = new_particle.y + new_particle.noise_linear
-            self.particles[i].theta = normalize_angle_radians(new_particle.theta + new_particle.noise_angular)
-            self.particles[i].color = new_particle.color
-            self.particles[i].weight = new_particle.weight
+            particle.x = x + noise_linear
+            particle.y = y + noise_linear
+            particle.theta = normalize_angle_radians(theta + noise_angular)
+            particle.color = color
+            particle.weight = weight
 
             # generate new noise for the next iteration
-            self.particles[i].noise_linear = random.uniform(*PARTICLE_NOISE_LINEAR_RANGE)
-            self.particles[i].noise_angular = random.uniform(*PARTICLE_NOISE_ANGULAR_RANGE)
-            self.particles[i].noise_measurement = random.uniform(*PARTICLE_NOISE_MEASUREMENT_RANGE)
-
-    # we want to do random selection with bias towards higher weighted particles
-    def select_particle(self, weights) -> Robot:
-        threshold = random.uniform(0, 1) # since weights are normalized, total weight is 1
-        running_sum = 0
-        
-        # search for the particle in which the threshold falls into its range
-        for i, weight in enumerate(weights):
-            running_sum += weight
-            if running_sum > threshold:
-                return self.particles[i]
+            particle.noise_linear = random.uniform(*self.noise_linear_range)
+            particle.noise_angular = random.uniform(*self.noise_angular_range)
+            particle.noise_measurement = random.uniform(*self.noise_measurement_range)
+
+    # same as regenerate_particles_list, for every particle at once
+    def regenerate_particles_array(self, selected: np.ndarray) -> None:
+        particles = self.particles
+
+        # work out the whole new generation before assigning any of it, the particle count can change here
+        x = particles.x[selected] + particles.noise_linear[selected]
+        y = particles.y[selected] + particles.noise_linear[selected]
+        theta = normalize_angle_radians_array(particles.theta[selected] + particles.noise_angular[selected])
+        weight = particles.weight[selected]
+        particles.x, particles.y, particles.theta, particles.weight = x, y, theta, weight
+
+        # generate new noise for the next iteration
+        particles.regenerate_noise()
+
+    def get_normalized_weights(self) -> np.ndarray:
+        if self.backend == "numpy":
+            return normalize_weights(self.particles.weight)
+        return normalize_weights([particle.weight for particle in self.particles])
+
+    # one iteration of the algorithm
+    def step(self) -> None:
+        self.apply_movement()
+        self.update_particle_weights()
+        self.regenerate_particles()
+        self.num_steps += 1
+
+    # copy the robot and particles into a read-only snapshot and hand it to the renderer
+    def publish_snapshot(self) -> None:
+        self.snapshots.publish(Snapshot(
+            step = self.num_steps,
+            robot_x = self.robot.x,
+            robot_y = self.robot.y,
+            robot_theta = self.robot.theta,
+            robot_color = self.robot.color,
+            x = frozen_copy(self.get_particle_array("x")),
+            y = frozen_copy(self.get_particle_array("y")),
+            theta = frozen_copy(self.get_particle_array("theta")),
+            weight = frozen_copy(self.get_particle_array("weight")),
+            particle_color = PARTICLE_COLOR,
+        ))
 
     def run_particle_filter(self) -> None:
-        while True:
+        while not self.stopped:
             # self.print_robot_and_particle_info()
-            self.apply_movement()
-            self.update_particle_weights()
-            self.regenerate_particles()
-            time.sleep(0.15)
+            self.step()
+            if self.snapshots.attached:
+                self.publish_snapshot()
+            if STEP_DELAY > 0:
+                time.sleep(STEP_DELAY)
 
         # debug: first frame (comment out the while loop above to see this)
         # for p in self.particles:
@@ -112,18 +363,23 @@ class ParticleFilter:
             # diagnostics
             self.print_robot_and_particle_info()
             self.difference_error.append(self.get_avg_particle_difference_err())
+            self.particle_counts.append(len(self.particles))
 
             # actual algorithm
-            self.apply_movement()
-            self.update_particle_weights()
-            self.regenerate_particles()
-            time.sleep(0.15)
+            self.step()
+            if self.snapshots.attached:
+                self.publish_snapshot()
+            if STEP_DELAY > 0:
+                time.sleep(STEP_DELAY)
         print("Finished running particle filter for", time_steps, "time steps. Stopping...")
     
     def print_robot_and_particle_info(self) -> None:
         robot = ["ROBOT (true position)",self.robot.x, self.robot.y, self.robot.theta]
 
-        best_particle = max(self.particles, key=lambda p: p.weight)
+        if self.backend == "numpy":
+            best_particle = self.particles[int(np.argmax(self.particles.weight))]
+        else:
+            best_particle = max(self.particles, key=lambda p: p.weight)
         best = ["BEST PARTICLE", best_particle.x, best_particle.y, best_particle.theta]
 
         difference_err = ["AVG DIFFERENCE ERR (all particles)"] + self.get_avg_particle_difference_err()
@@ -132,6 +388,10 @@ class ParticleFilter:
         print("----------------------------------------------------------------------------------------------")
     
     def get_avg_particle_difference_err(self) -> List[float]:
+        if self.backend == "numpy":
+            avg_x, avg_y, avg_theta = self.particles.x.mean(), self.particles.y.mean(), self.particles.theta.mean()
+            return [abs(float(avg_x) - self.robot.x), abs(float(avg_y) - self.robot.y), abs(float(avg_theta) - self.robot.theta)]
+
         avg_x = sum(p.x for p in self.particles) / len(self.particles)
         avg_y = sum(p.y for p in self.particles) / len(self.particles)
         avg_theta = sum(p.theta for p in self.particles) / len(self.particles)
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from helper import *
 from conf import *
 
@@ -43,4 +44,9 @@ class Robot:
         for obstacle in obstacles:
             x, y = obstacle    
             distances.append((math.sqrt((x - self.x)**2 + (y - self.y)**2) + self.noise_measurement))
-        return distances
\ No newline at end of file
+        return distances
+
+    # simulated range sensor for the likelihood field model: distance along each beam to the first obstacle on the map
+    def scan(self, likelihood_field, beam_angles):
+        ranges = likelihood_field.raycast(self.x, self.y, self.theta, beam_angles)
+        return np.where(ranges < likelihood_field.max_range, ranges + self.noise_measurement, ranges)
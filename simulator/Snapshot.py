@@ -0,0 +1,45 @@
+import numpy as np
+from typing import *
+
+# Immutable copy of the filter's state after a step, what the renderer draws
+# the particle arrays are copies marked read-only, so nothing the filter does afterwards can change a snapshot being drawn
+class Snapshot(NamedTuple):
+    step: int
+    robot_x: float
+    robot_y: float
+    robot_theta: float
+    robot_color: str
+    x: np.ndarray
+    y: np.ndarray
+    theta: np.ndarray
+    weight: np.ndarray
+    particle_color: str
+
+def frozen_copy(values) -> np.ndarray:
+    array = np.array(values, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+# Single slot holding the latest complete snapshot
+# the filter thread swaps in a new snapshot with one reference assignment (atomic under the GIL) and never waits on the renderer,
+# the renderer picks up whatever is latest at its own frame rate, steps published in between are dropped
+# nothing is copied per step until a renderer attaches, so headless runs don't pay for snapshots nobody draws
+class SnapshotBuffer:
+    def __init__(self) -> None:
+        self.snapshot = None
+        self.attached = False # set by the renderer drawing from this buffer
+        self.published = 0 # snapshots published by the filter
+        self.taken = 0 # snapshots drawn by the renderer, published - taken were dropped
+        self.last_step = None
+
+    def publish(self, snapshot: Snapshot) -> None:
+        self.snapshot = snapshot
+        self.published += 1
+
+    # latest snapshot, None until the filter publishes its first one
+    def latest(self) -> Optional[Snapshot]:
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.step != self.last_step:
+            self.last_step = snapshot.step
+            self.taken += 1
+        return snapshot
@@ -7,6 +7,40 @@ NUM_PARTICLES = 100
 NUM_OBSTACLES = 10
 OBSTACLE_SEED = 45
 
+# Particle storage: "python" keeps a list of Robot objects, "numpy" keeps every particle attribute in arrays (see ParticleArray.py)
+PARTICLE_BACKEND = "python"
+PARTICLE_CHUNK_SIZE = 8192 # numpy backend: particles observed per block, bounds memory to chunk size x obstacles
+
+# Parallel execution: with more than 1 worker, particle motion and weighting run in a process pool on shards of the particles (see ParallelParticleFilter.py)
+NUM_WORKERS = 1
+SHARDS_PER_WORKER = 4 # more shards than workers evens out uneven shards
+
+# Resampling
+RESAMPLING_METHOD = "systematic" # "systematic", "stratified", "residual" or "multinomial" (see resampling.py)
+RESAMPLE_ESS_THRESHOLD = 0.5 # only resample when the effective sample size drops below this fraction of the particle count
+
+# KLD-sampling (Fox 2003): resampling picks the particle count from how spread out the belief is, NUM_PARTICLES is only the starting count
+KLD_SAMPLING = False
+KLD_BIN_SIZE_XY = 20 # histogram bin size for x and y
+KLD_BIN_SIZE_THETA = math.pi / 9 # histogram bin size for the heading angle (20 degrees)
+KLD_EPSILON = 0.05 # maximum KL divergence between the sampled and the true belief
+KLD_DELTA = 0.01 # probability of exceeding KLD_EPSILON
+KLD_MIN_PARTICLES = 50
+KLD_MAX_PARTICLES = 5000
+
+# pause between filter steps so the simulation can be followed on screen, 0 runs the filter at full speed
+# (the renderer draws the latest published snapshot at its own frame rate either way, see Snapshot.py)
+STEP_DELAY = 0.15
+
+# Particle rendering (see Environment.py)
+# "circles" draws every particle like the robot, "points" writes them into the screen pixels in bulk, "heatmap" shows particle density (toggle with h)
+# "auto" uses circles up to PARTICLE_RENDER_THRESHOLD particles and points beyond that
+PARTICLE_RENDER_MODE = "auto"
+PARTICLE_RENDER_THRESHOLD = 2000
+PARTICLE_POINT_SIZE = 3 # pixels per side of a particle in "points" mode
+PARTICLE_HEATMAP_CELL_SIZE = 5 # pixels per side of a heatmap cell
+PARTICLE_HEADING_TOP_K = 50 # points/heatmap: only the highest weighted particles get a heading line
+
 # diagnostics
 NUM_TIME_STEPS = 50 # set to -1 to run indefinitely (normal simulation)
 
@@ -24,6 +58,21 @@ PARTICLE_COLOR = "yellow"
 DISTANCE_SIGMA = 15
 HEADING_SIGMA = 30
 
+# Measurement model
+# "obstacles": the robot measures its distance to every obstacle and particles compare against the same distances
+# "likelihood_field": the robot casts LIKELIHOOD_FIELD_NUM_BEAMS range beams, particles score their beam endpoints in a precomputed distance grid of the map
+#   (cost doesn't grow with the number of obstacles, but the scan depends on heading so it needs more particles than "obstacles" to converge)
+SENSOR_MODEL = "obstacles"
+LIKELIHOOD_FIELD_RESOLUTION = 2 # world units per grid cell
+LIKELIHOOD_FIELD_NUM_BEAMS = 36
+LIKELIHOOD_FIELD_MAX_RANGE = 300 # beams that don't hit anything within this range are ignored
+LIKELIHOOD_FIELD_Z_HIT = 0.9 # weight of the normal distribution around the nearest obstacle
+LIKELIHOOD_FIELD_Z_RANDOM = 0.1 # weight of a uniformly random reading
+MAP_CELL_SIZE = 50 # world units per grid cell for maps saved by the control machine's MapUI
+
+# "log" sums log-likelihoods and normalizes with log-sum-exp, "product" multiplies one normal_distribution per obstacle (underflows to 0 with many obstacles)
+WEIGHTING_MODE = "product"
+
 # Movement distance and rotation ranges for simulation purposes - for apply_movement()
 MOVEMENT_DISTANCE_RANGE = [0, 4]
 MOVEMENT_ROTATION_RANGE = [-0.15, 0.15]
@@ -1,10 +1,41 @@
 import math
+import random
+import numpy as np
+from statistics import NormalDist
+from typing import *
+from conf import *
 
 # return value at x, of a normal distribution pdf N(mu, sigma)
 def normal_distribution(mu, sigma, x):
     exponent = -((x - mu) ** 2) / (2 * sigma ** 2)
     return math.exp(exponent) / math.sqrt(2 * math.pi * sigma ** 2)
 
+# numpy version of normal_distribution, mu and x can be arrays (they are broadcast against each other)
+def normal_distribution_array(mu, sigma, x):
+    exponent = -((x - mu) ** 2) / (2 * sigma ** 2)
+    return np.exp(exponent) / math.sqrt(2 * math.pi * sigma ** 2)
+
+# log of the normal distribution pdf's normalization constant 1 / sqrt(2 * pi * sigma^2)
+def log_normal_constant(sigma):
+    return -0.5 * math.log(2 * math.pi * sigma ** 2)
+
+# log(sum(exp(values))) without overflowing or underflowing
+def log_sum_exp(values):
+    values = np.asarray(values, dtype=np.float64)
+    max_value = np.max(values)
+    if not np.isfinite(max_value):
+        return max_value
+    return max_value + math.log(np.sum(np.exp(values - max_value)))
+
+# KLD-sampling (Fox 2003): number of particles needed so that, with probability 1 - delta, the KL divergence
+# between the sampled belief and the true belief stays below epsilon, given k non-empty histogram bins
+def kld_sample_size(k, epsilon, delta):
+    z = NormalDist().inv_cdf(1 - delta)
+    k_minus_1 = np.maximum(np.asarray(k, dtype=np.float64) - 1, 1)
+    a = 2 / (9 * k_minus_1)
+    sample_size = k_minus_1 / (2 * epsilon) * (1 - a + np.sqrt(a) * z) ** 3
+    return np.where(np.asarray(k) > 1, np.ceil(sample_size), 1).astype(np.int64)
+
 # Ensure the angle is within the range [-pi, pi]
 def normalize_angle_radians(angle):
     normalized_angle = angle % (2 * math.pi)
@@ -12,4 +43,22 @@ def normalize_angle_radians(angle):
     if normalized_angle > math.pi:
         normalized_angle -= 2 * math.pi
 
-    return normalized_angle
\ No newline at end of file
+    return normalized_angle
+
+# numpy version of normalize_angle_radians, for arrays of angles
+def normalize_angle_radians_array(angle):
+    normalized_angle = np.mod(angle, 2 * math.pi)
+    return np.where(normalized_angle > math.pi, normalized_angle - 2 * math.pi, normalized_angle)
+
+# Generate random obstacles for the particle filter
+def generate_obstacles(n: int, seed: int = None) -> List[Tuple[float, float]]:
+    if seed is not None:
+        random.seed(seed)
+    
+    coordinates = []
+    for _ in range(n):
+        x = random.uniform(0, WIDTH)
+        y = random.uniform(0, HEIGHT)
+        coordinates.append((x, y))
+    
+    return coordinates
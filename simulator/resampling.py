@@ -0,0 +1,59 @@
+import numpy as np
+
+# Resampling strategies for the particle filter
+# each one takes normalized weights and a numpy random generator and returns the index of the particle
+# every new particle is copied from, so no particle is ever dropped
+# num_samples defaults to the current particle count, KLD-sampling asks for more to pick its sample size from
+
+# binary search of the thresholds in the running sum of the weights
+def search_running_sum(weights, thresholds):
+    running_sum = np.cumsum(weights)
+    running_sum[-1] = 1.0 # guard against rounding leaving the total just below 1
+    return np.searchsorted(running_sum, thresholds, side="right")
+
+# independent random threshold for every particle (what select_particle used to do, one linear scan each)
+def multinomial_resample(weights, rng, num_samples=None):
+    n = len(weights) if num_samples is None else num_samples
+    return search_running_sum(weights, rng.uniform(0, 1, n))
+
+# one random offset shared by N evenly spaced thresholds, lowest variance of the four
+def systematic_resample(weights, rng, num_samples=None):
+    n = len(weights) if num_samples is None else num_samples
+    return search_running_sum(weights, (rng.uniform(0, 1) + np.arange(n)) / n)
+
+# one random threshold inside each of the N equal strata of [0, 1)
+def stratified_resample(weights, rng, num_samples=None):
+    n = len(weights) if num_samples is None else num_samples
+    return search_running_sum(weights, (rng.uniform(0, 1, n) + np.arange(n)) / n)
+
+# copy every particle floor(N * weight) times, then fill the remaining slots multinomially from what's left over
+def residual_resample(weights, rng, num_samples=None):
+    n = len(weights) if num_samples is None else num_samples
+    scaled_weights = n * np.asarray(weights)
+    copies = np.floor(scaled_weights).astype(np.int64)
+    selected = np.repeat(np.arange(len(weights)), copies)
+
+    remaining = n - len(selected)
+    if remaining > 0:
+        residual_weights = normalize_weights(scaled_weights - copies)
+        selected = np.concatenate([selected, search_running_sum(residual_weights, rng.uniform(0, 1, remaining))])
+    return selected
+
+RESAMPLING_METHODS = {
+    "multinomial": multinomial_resample,
+    "systematic": systematic_resample,
+    "stratified": stratified_resample,
+    "residual": residual_resample,
+}
+
+# 1 / sum(w^2) for normalized weights: N when all weights are equal, 1 when a single particle has all the weight
+def effective_sample_size(weights):
+    return 1.0 / np.sum(np.square(weights))
+
+# weights scaled to sum to 1, all weights zero means we know nothing so every particle is treated as equally likely
+def normalize_weights(weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    total_weight = weights.sum()
+    if total_weight <= 0 or not np.isfinite(total_weight):
+        return np.full(len(weights), 1.0 / len(weights))
+    return weights / total_weight
@@ -0,0 +1,165 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import time
+import numpy as np
+from typing import *
+from conf import *
+from helper import *
+from Robot import *
+from ParticleFilter import *
+
+# Headless parameter sweeps for the particle filter
+# every combination of the given settings is run as a trial in a process pool, without pygame and without sleeping between steps
+# per-step metrics are streamed to results.csv as trials finish, and collected into results.npz and comparison plots at the end
+#
+# example: python3 sweep.py --particles 100 1000 --distance-sigma 10 15 30 --obstacle-seeds 45 46 47 --trials 3
+
+CONFIG_COLUMNS = ["trial", "particles", "distance_sigma", "heading_sigma", "noise_scale", "obstacles", "obstacle_seed", "seed"]
+METRIC_COLUMNS = ["step", "err_x", "err_y", "err_theta", "particle_count", "step_time"]
+
+# every combination of the swept settings, each repeated with a different robot/particle seed
+def build_trials(args) -> List[Dict[str, Any]]:
+    trials = []
+    grid = itertools.product(args.particles, args.distance_sigma, args.heading_sigma, args.noise_scale, args.obstacles, args.obstacle_seeds, range(args.trials))
+    for particles, distance_sigma, heading_sigma, noise_scale, obstacles, obstacle_seed, repeat in grid:
+        trials.append({
+            "trial": len(trials),
+            "particles": particles,
+            "distance_sigma": distance_sigma,
+            "heading_sigma": heading_sigma,
+            "noise_scale": noise_scale,
+            "obstacles": obstacles,
+            "obstacle_seed": obstacle_seed,
+            "seed": args.seed + repeat,
+            "steps": args.steps,
+        })
+    return trials
+
+# same setup as main.py, with the robot and particle noise ranges scaled by noise_scale
+def run_trial(trial: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    obstacles = generate_obstacles(trial["obstacles"], trial["obstacle_seed"])
+    random.seed(trial["seed"])
+
+    scale = trial["noise_scale"]
+    noise_ranges = tuple([scale * i for i in noise_range] for noise_range in (ROBOT_NOISE_LINEAR_RANGE, ROBOT_NOISE_ANGULAR_RANGE, ROBOT_NOISE_MEASUREMENT_RANGE))
+    robot = Robot(
+        x = ROBOT_STARTING_POS_X,
+        y = ROBOT_STARTING_POS_Y,
+        theta = ROBOT_STARTING_ANGLE,
+        color = ROBOT_COLOR,
+        noise_linear = random.uniform(*noise_ranges[0]),
+        noise_angular = random.uniform(*noise_ranges[1]),
+        noise_measurement = random.uniform(*noise_ranges[2]),
+    )
+    particle_filter = ParticleFilter(
+        num_particles = trial["particles"],
+        robot = robot,
+        obstacles = obstacles,
+        distance_sigma = trial["distance_sigma"],
+        heading_sigma = trial["heading_sigma"],
+        noise_ranges = noise_ranges,
+    )
+
+    # metrics are recorded before every step, like run_particle_filter_num_time_steps does
+    steps = trial["steps"]
+    metrics = {column: np.zeros(steps, dtype=int if column in ("step", "particle_count") else float) for column in METRIC_COLUMNS}
+    for step in range(steps):
+        metrics["step"][step] = step
+        metrics["err_x"][step], metrics["err_y"][step], metrics["err_theta"][step] = particle_filter.get_avg_particle_difference_err()
+        metrics["particle_count"][step] = len(particle_filter.particles)
+
+        start = time.perf_counter()
+        particle_filter.step()
+        metrics["step_time"][step] = time.perf_counter() - start
+
+    return trial, metrics
+
+# comparison plots: mean position error over time for each configuration, and final error against particle count
+def plot_results(columns: Dict[str, np.ndarray], output_dir: str) -> None:
+    import matplotlib
+    matplotlib.use("Agg") # headless
+    import matplotlib.pyplot as plt
+
+    position_err = np.hypot(columns["err_x"], columns["err_y"])
+    settings = ["particles", "distance_sigma", "heading_sigma", "noise_scale", "obstacles"]
+    configurations = sorted(set(zip(*(columns[setting] for setting in settings))))
+
+    # average over obstacle seeds and repeats
+    plt.figure()
+    final_errors = []
+    for configuration in configurations:
+        rows = np.all([columns[setting] == value for setting, value in zip(settings, configuration)], axis=0)
+        steps = np.unique(columns["step"][rows])
+        mean_err = np.array([position_err[rows & (columns["step"] == step)].mean() for step in steps])
+        final_errors.append((configuration, mean_err[-1]))
+
+        label = ", ".join(f"{setting}={value:g}" for setting, value in zip(settings, configuration))
+        plt.plot(steps, mean_err, label=label)
+
+    plt.xlabel('Time Steps')
+    plt.ylabel('Average Position Difference Error')
+    plt.title('Average Position Difference Error Over Time')
+    plt.legend(fontsize=6)
+    plt.savefig(os.path.join(output_dir, "error_over_time.png"), bbox_inches='tight')
+    plt.close()
+
+    plt.figure()
+    for configuration, final_error in final_errors:
+        plt.scatter(configuration[0], final_error)
+    plt.xscale('log')
+    plt.xlabel('Number of Particles')
+    plt.ylabel('Final Average Position Difference Error')
+    plt.title('Final Error vs Number of Particles')
+    plt.savefig(os.path.join(output_dir, "final_error_vs_particles.png"), bbox_inches='tight')
+    plt.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run particle filter parameter sweeps without the pygame visualization")
+    parser.add_argument("--particles", type=int, nargs="+", default=[NUM_PARTICLES])
+    parser.add_argument("--distance-sigma", type=float, nargs="+", default=[DISTANCE_SIGMA])
+    parser.add_argument("--heading-sigma", type=float, nargs="+", default=[HEADING_SIGMA])
+    parser.add_argument("--noise-scale", type=float, nargs="+", default=[1.0], help="multiplier for the robot/particle noise ranges in conf.py")
+    parser.add_argument("--obstacles", type=int, nargs="+", default=[NUM_OBSTACLES])
+    parser.add_argument("--obstacle-seeds", type=int, nargs="+", default=[OBSTACLE_SEED])
+    parser.add_argument("--trials", type=int, default=1, help="repeats of every configuration with different seeds")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first repeat")
+    parser.add_argument("--steps", type=int, default=max(NUM_TIME_STEPS, 1))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output-dir", default="sweep_results")
+    parser.add_argument("--no-plots", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    trials = build_trials(args)
+    print(f"Running {len(trials)} trials on {args.workers} workers...")
+
+    columns = {column: [] for column in CONFIG_COLUMNS + METRIC_COLUMNS}
+    start = time.perf_counter()
+    with open(os.path.join(args.output_dir, "results.csv"), "w", newline="") as file, multiprocessing.Pool(args.workers) as pool:
+        writer = csv.writer(file)
+        writer.writerow(CONFIG_COLUMNS + METRIC_COLUMNS)
+
+        for finished, (trial, metrics) in enumerate(pool.imap_unordered(run_trial, trials), start=1):
+            rows = zip(*([trial[column]] * args.steps for column in CONFIG_COLUMNS), *(metrics[column] for column in METRIC_COLUMNS))
+            writer.writerows(rows)
+            file.flush()
+
+            for column in CONFIG_COLUMNS:
+                columns[column].append(np.full(args.steps, trial[column]))
+            for column in METRIC_COLUMNS:
+                columns[column].append(metrics[column])
+            print(f"[{finished}/{len(trials)}] trial {trial['trial']} done, final errors: {metrics['err_x'][-1]:.2f}, {metrics['err_y'][-1]:.2f}, {metrics['err_theta'][-1]:.2f}")
+
+    columns = {column: np.concatenate(values) for column, values in columns.items()}
+    np.savez_compressed(os.path.join(args.output_dir, "results.npz"), **columns)
+    print(f"Finished {len(trials)} trials in {time.perf_counter() - start:.1f} s, results in {args.output_dir}")
+
+    if not args.no_plots:
+        plot_results(columns, args.output_dir)
+
+if __name__ == "__main__":
+    main()